@@ -0,0 +1,115 @@
+from django.core import mail
+from django.test import Client
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.mail import send_reset_email
+from messaging.tests.utils import SIZES, QueryBudgetTestCase
+
+PASSWORD = "Secret-Passw0rd!"
+
+
+class AuthenticationQueryBudgetTests(QueryBudgetTestCase):
+    # Budgets must not grow with the number of users or conversations.
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def seed_users(self, count):
+        for i in range(count):
+            user = self.create_user(email=f"seed-{count}-{i}@example.com")
+            self.seed(user, 1, 1)
+
+    def test_login(self):
+        user = self.create_user(password=PASSWORD)
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                self.seed_users(users)
+                # user lookup
+                with self.assertBudget(queries=1):
+                    response = self.client.post("/auth/login/", {"email": user.email, "password": PASSWORD}, format="json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_token_obtain_and_refresh(self):
+        user = self.create_user(password=PASSWORD)
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                self.seed_users(users)
+                with self.assertBudget(queries=2):
+                    response = self.client.post("/auth/token/", {"email": user.email, "password": PASSWORD}, format="json")
+                self.assertEqual(response.status_code, 200)
+                with self.assertBudget(queries=1):
+                    response = self.client.post("/auth/token/refresh/", {"refresh": str(RefreshToken.for_user(user))}, format="json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_signup(self):
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                self.seed_users(users)
+                # email exists check, insert, verification code
+                with self.assertBudget(queries=3):
+                    response = self.client.post("/auth/signup/", {
+                        "email": f"new-{users}@example.com",
+                        "password": PASSWORD,
+                        "password_confirmation": PASSWORD,
+                    }, format="json")
+                self.assertEqual(response.status_code, 201)
+
+    def test_verify_email_and_resend(self):
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                self.seed_users(users)
+                user = self.create_user(email=f"unverified-{users}@example.com", email_verified=False, is_active=False)
+                # user lookup, new code
+                with self.assertBudget(queries=2):
+                    response = self.client.post("/auth/resend_verification_code/", {"email": user.email}, format="json")
+                self.assertEqual(response.status_code, 200)
+                user.refresh_from_db()
+                # user lookup, activation
+                with self.assertBudget(queries=2):
+                    response = self.client.post("/auth/verify_email/", {
+                        "email": user.email, "verification_code": user.verification_code,
+                    }, format="json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_password_reset(self):
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                self.seed_users(users)
+                user = self.create_user(email=f"reset-{users}@example.com")
+                # user lookup, token saved by the view and by the mail helper
+                with self.assertBudget(queries=3):
+                    response = self.client.post("/auth/send_reset_password_email/", {"email": user.email}, format="json")
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(mail.outbox)
+
+                send_reset_email(user)
+                # user lookup, new password
+                with self.assertBudget(queries=2):
+                    response = self.client.post("/auth/reset_password/", {
+                        "token": user.reset_token,
+                        "new_password": "Another-Passw0rd!",
+                        "new_password_confirmation": "Another-Passw0rd!",
+                    }, format="json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_csrf_token(self):
+        with self.assertBudget(queries=0):
+            response = self.client.get("/auth/csrf_token/")
+        self.assertEqual(response.status_code, 200)
+
+
+class UserAdminQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_user_changelist(self):
+        admin = self.create_user(email="admin@example.com", is_staff=True, is_superuser=True)
+        client = Client()
+        client.force_login(admin)
+        for users, _ in SIZES:
+            with self.subTest(users=users):
+                for i in range(users):
+                    self.create_user(email=f"listed-{users}-{i}@example.com")
+                # session, user, counts, page of users
+                with self.assertBudget(queries=6):
+                    response = client.get("/admin/authentication/customuser/")
+                self.assertEqual(response.status_code, 200)
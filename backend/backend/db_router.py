@@ -0,0 +1,142 @@
+import random
+from contextvars import ContextVar
+import jwt
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core import checks
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+# Read/write splitting over DATABASE_REPLICAS. Inside a request, reads go to a
+# random replica and writes to the primary ("default"). To read your own
+# writes, the rest of a request is pinned to the primary after its first
+# write, unsafe requests (POST, PUT, ...) are pinned from the start, and a
+# user who wrote within the last READ_YOUR_WRITES_SECONDS is pinned entirely.
+# Code outside requests (background jobs, batch workers, management
+# commands) always uses the primary, since it often reads rows that were
+# just written. Models in PRIMARY_MODELS, whose rows those workers update
+# while clients poll them, are always read from the primary too.
+#
+# The write window is kept in Django's cache, so it only holds across
+# server processes with a shared cache; check_shared_cache warns otherwise.
+
+REPLICA_PREFIX = "replica_"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+PRIMARY_MODELS = {"messaging.generationjob"}
+
+# Caches that are not shared between processes.
+LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+class _RequestState:
+    def __init__(self, user_id, pinned):
+        self.user_id = user_id
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def _last_write_key(user_id):
+    return f"db-router:last-write:{user_id}"
+
+
+def _remember_write(user_id):
+    if user_id is not None:
+        cache.set(_last_write_key(user_id), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned:
+            return "default"
+        if model is not None and model._meta.label_lower in PRIMARY_MODELS:
+            return "default"
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else "default"
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+            if not state.wrote:
+                state.wrote = True
+                _remember_write(state.user_id)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replication.
+        return db == "default"
+
+
+def _request_user_id(request):
+    # The user is only needed to route their reads, so the access token is
+    # read without verifying it: a forged token can at most pin reads to the
+    # primary. Views still authenticate the request as usual.
+    header = request.META.get("HTTP_AUTHORIZATION", "").split()
+    if len(header) == 2 and header[0] in api_settings.AUTH_HEADER_TYPES:
+        try:
+            payload = jwt.decode(header[1], options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            payload = {}
+        user_id = payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            return user_id
+    session = getattr(request, "session", None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+class ReadYourWritesMiddleware:
+    # Enables routing for the request. Place it after AuthenticationMiddleware
+    # so session users are known.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        user_id = _request_user_id(request)
+        pinned = request.method not in SAFE_METHODS or (
+            user_id is not None and cache.get(_last_write_key(user_id)) is not None
+        )
+        state = _RequestState(user_id, pinned)
+        token = _state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+            if state.wrote:
+                # Start the window when the response is sent, not at the first write.
+                _remember_write(user_id)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    if not replica_aliases():
+        return []
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        "DATABASE_REPLICAS is set but the default cache is local to each process, "
+        "so users may not read their own writes when requests go to another process.",
+        hint="Configure a shared cache (e.g. Redis or Memcached) in CACHES.",
+        id="db_router.W001",
+    )]
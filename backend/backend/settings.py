@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,52 @@ def load_environment_variables():
         'MAX_TOKENS_TITLE': int(os.getenv("MAX_TOKENS_TITLE", "64")),
         'TEMPERATURE': float(os.getenv("TEMPERATURE", "0.7")),
         'TEMPERATURE_TITLE': float(os.getenv("TEMPERATURE_TITLE", "0.1")),
+        'MISTRAL_TIMEOUT': float(os.getenv("MISTRAL_TIMEOUT", "60")),
+        'MODEL_ROUTES': json.loads(os.getenv("MODEL_ROUTES", "null")),
+        'COMBINED_TITLE_REPLY': os.getenv("COMBINED_TITLE_REPLY", "False").lower() == "true",
+        'BATCH_MAX_WORKERS': int(os.getenv("BATCH_MAX_WORKERS", "8")),
+        'BATCH_MAX_ITEMS': int(os.getenv("BATCH_MAX_ITEMS", "100")),
+        'GENERATION_WORKERS': int(os.getenv("GENERATION_WORKERS", "4")),
+        'JOB_MAX_WAIT': float(os.getenv("JOB_MAX_WAIT", "25")),
+
+        # JSON Configuration ("auto" uses orjson when installed)
+        'JSON_CODEC': os.getenv("JSON_CODEC", "auto"),
+
+        # Message Search Configuration
+        'SEARCH_INDEX_PATH': os.getenv("SEARCH_INDEX_PATH", str(BASE_DIR / "search_index.sqlite3")),
+
+        # Context Selection Configuration
+        'CONTEXT_MODE': os.getenv("CONTEXT_MODE", "full"),
+        'CONTEXT_RECENT_MESSAGES': int(os.getenv("CONTEXT_RECENT_MESSAGES", "8")),
+        'CONTEXT_TOP_K': int(os.getenv("CONTEXT_TOP_K", "6")),
+        'EMBEDDER': os.getenv("EMBEDDER", "mistral"),
+        'EMBEDDINGS_URL': os.getenv("EMBEDDINGS_URL", "https://api.mistral.ai/v1/embeddings"),
+        'EMBEDDINGS_MODEL': os.getenv("EMBEDDINGS_MODEL", "mistral-embed"),
+        'VECTOR_DIR': os.getenv("VECTOR_DIR", str(BASE_DIR / "vectors")),
+
+        # Message Storage Configuration
+        'MESSAGE_STORE_BACKEND': os.getenv("MESSAGE_STORE_BACKEND", "tinydb"),
+        'MESSAGE_COMPRESS_THRESHOLD': int(os.getenv("MESSAGE_COMPRESS_THRESHOLD", "1024")),
+
+        # Retention Configuration
+        'ARCHIVE_DIR': os.getenv("ARCHIVE_DIR", str(BASE_DIR / "archive")),
+        'ARCHIVE_AFTER_DAYS': int(os.getenv("ARCHIVE_AFTER_DAYS", "365")),
+
+        # Database Replica Configuration
+        'DATABASE_REPLICAS': [path for path in os.getenv("DATABASE_REPLICAS", "").split(",") if path.strip()],
+        'READ_YOUR_WRITES_SECONDS': float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")),
+
+        # Profiling Configuration
+        'PROFILING_DIR': os.getenv("PROFILING_DIR", str(BASE_DIR / "profiles")),
+        'PROFILING_SAMPLE_RATE': float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+        'PROFILING_MAX_FILES': int(os.getenv("PROFILING_MAX_FILES", "200")),
+        'PROFILING_MAX_BYTES': int(os.getenv("PROFILING_MAX_BYTES", str(100 * 1024 * 1024))),
+
+        # Circuit Breaker Configuration
+        'CIRCUIT_BREAKER_FAILURE_THRESHOLD': int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5")),
+        'CIRCUIT_BREAKER_LATENCY_THRESHOLD': float(os.getenv("CIRCUIT_BREAKER_LATENCY_THRESHOLD", "30")),
+        'CIRCUIT_BREAKER_RESET_TIMEOUT': float(os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "30")),
+        'CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS': int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS", "1")),
         
         # Email Configuration
         'EMAIL_BACKEND': os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"),
@@ -89,6 +136,22 @@ def load_environment_variables():
     print("✅ Environment variables loaded successfully!")
     return env_vars
 
+# Models per task, tried in order; later entries are fallbacks used on 429/5xx or timeouts.
+DEFAULT_MODEL_ROUTES = {
+    "chat": [
+        {"model": "mistral-small-latest", "timeout": 60},
+        {"model": "open-mistral-nemo", "timeout": 60},
+    ],
+    "title": [
+        {"model": "ministral-3b-latest", "timeout": 10},
+        {"model": "mistral-small-latest", "timeout": 20},
+    ],
+    "summarization": [
+        {"model": "mistral-small-latest", "timeout": 60},
+        {"model": "open-mistral-nemo", "timeout": 60},
+    ],
+}
+
 # Load environment variables into dictionary
 ENV_VARS = load_environment_variables()
 
@@ -114,6 +177,7 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "authentication",
     "messaging",
+    "profiling",
     "corsheaders"
 ]
 
@@ -124,6 +188,48 @@ MAX_TOKENS = ENV_VARS['MAX_TOKENS']
 MAX_TOKENS_TITLE = ENV_VARS['MAX_TOKENS_TITLE']
 TEMPERATURE = ENV_VARS['TEMPERATURE']
 TEMPERATURE_TITLE = ENV_VARS['TEMPERATURE_TITLE']
+MISTRAL_TIMEOUT = ENV_VARS['MISTRAL_TIMEOUT']
+MODEL_ROUTES = {**DEFAULT_MODEL_ROUTES, **(ENV_VARS['MODEL_ROUTES'] or {})}
+COMBINED_TITLE_REPLY = ENV_VARS['COMBINED_TITLE_REPLY']
+BATCH_MAX_WORKERS = ENV_VARS['BATCH_MAX_WORKERS']
+BATCH_MAX_ITEMS = ENV_VARS['BATCH_MAX_ITEMS']
+GENERATION_WORKERS = ENV_VARS['GENERATION_WORKERS']
+JOB_MAX_WAIT = ENV_VARS['JOB_MAX_WAIT']
+
+# JSON Configuration
+JSON_CODEC = ENV_VARS['JSON_CODEC']
+
+# Message Search Configuration
+SEARCH_INDEX_PATH = ENV_VARS['SEARCH_INDEX_PATH']
+
+# Context Selection Configuration
+CONTEXT_MODE = ENV_VARS['CONTEXT_MODE']
+CONTEXT_RECENT_MESSAGES = ENV_VARS['CONTEXT_RECENT_MESSAGES']
+CONTEXT_TOP_K = ENV_VARS['CONTEXT_TOP_K']
+EMBEDDER = ENV_VARS['EMBEDDER']
+EMBEDDINGS_URL = ENV_VARS['EMBEDDINGS_URL']
+EMBEDDINGS_MODEL = ENV_VARS['EMBEDDINGS_MODEL']
+VECTOR_DIR = ENV_VARS['VECTOR_DIR']
+
+# Message Storage Configuration
+MESSAGE_STORE_BACKEND = ENV_VARS['MESSAGE_STORE_BACKEND']
+MESSAGE_COMPRESS_THRESHOLD = ENV_VARS['MESSAGE_COMPRESS_THRESHOLD']
+
+# Retention Configuration
+ARCHIVE_DIR = ENV_VARS['ARCHIVE_DIR']
+ARCHIVE_AFTER_DAYS = ENV_VARS['ARCHIVE_AFTER_DAYS']
+
+# Profiling Configuration
+PROFILING_DIR = ENV_VARS['PROFILING_DIR']
+PROFILING_SAMPLE_RATE = ENV_VARS['PROFILING_SAMPLE_RATE']
+PROFILING_MAX_FILES = ENV_VARS['PROFILING_MAX_FILES']
+PROFILING_MAX_BYTES = ENV_VARS['PROFILING_MAX_BYTES']
+
+# Circuit Breaker Configuration
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = ENV_VARS['CIRCUIT_BREAKER_FAILURE_THRESHOLD']
+CIRCUIT_BREAKER_LATENCY_THRESHOLD = ENV_VARS['CIRCUIT_BREAKER_LATENCY_THRESHOLD']
+CIRCUIT_BREAKER_RESET_TIMEOUT = ENV_VARS['CIRCUIT_BREAKER_RESET_TIMEOUT']
+CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS = ENV_VARS['CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS']
 
 # Email Configuration
 EMAIL_BACKEND = ENV_VARS['EMAIL_BACKEND']
@@ -141,6 +247,15 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "messaging.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "messaging.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 # JWT Configuration
@@ -169,6 +284,7 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    "profiling.middleware.ProfilingMiddleware",
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     "django.middleware.security.SecurityMiddleware",
@@ -176,6 +292,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.db_router.ReadYourWritesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -210,6 +327,17 @@ DATABASES = {
     }
 }
 
+# Read replicas (SQLite files kept in sync by an external process); see backend/db_router.py.
+for index, path in enumerate(ENV_VARS['DATABASE_REPLICAS']):
+    DATABASES[f"replica_{index}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / path.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["backend.db_router.PrimaryReplicaRouter"]
+READ_YOUR_WRITES_SECONDS = ENV_VARS['READ_YOUR_WRITES_SECONDS']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,84 @@
+from unittest import mock
+import jwt
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from backend.db_router import PrimaryReplicaRouter, ReadYourWritesMiddleware, check_shared_cache
+from messaging.models import Conversation, GenerationJob
+
+
+def bearer(user_id):
+    # Routing only reads the claim, so any signature will do.
+    return f"Bearer {jwt.encode({'user_id': user_id}, 'not-the-key', algorithm='HS256')}"
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    READ_YOUR_WRITES_SECONDS=5,
+)
+class DatabaseRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        patcher = mock.patch("backend.db_router.replica_aliases", return_value=["replica_0"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_request(self, operations, method="get", user_id=None, model=Conversation):
+        # Route `operations` ("read"/"write") of `model` inside a request; returns the databases chosen.
+        routed = []
+
+        def view(request):
+            for operation in operations:
+                if operation == "read":
+                    routed.append(self.router.db_for_read(model))
+                else:
+                    routed.append(self.router.db_for_write(model))
+            return None
+
+        headers = {"HTTP_AUTHORIZATION": bearer(user_id)} if user_id is not None else {}
+        request = getattr(self.factory, method)("/", **headers)
+        ReadYourWritesMiddleware(view)(request)
+        return routed
+
+    def test_outside_requests_everything_uses_the_primary(self):
+        self.assertEqual(self.router.db_for_read(None), "default")
+        self.assertEqual(self.router.db_for_write(None), "default")
+
+    def test_safe_reads_use_a_replica(self):
+        self.assertEqual(self.run_request(["read", "read"]), ["replica_0", "replica_0"])
+
+    def test_reads_after_a_write_are_pinned(self):
+        self.assertEqual(self.run_request(["read", "write", "read"]), ["replica_0", "default", "default"])
+
+    def test_unsafe_requests_are_pinned(self):
+        self.assertEqual(self.run_request(["read"], method="post"), ["default"])
+
+    def test_user_is_pinned_for_a_window_after_writing(self):
+        self.run_request(["write"], user_id=1)
+        self.assertEqual(self.run_request(["read"], user_id=1), ["default"])
+        self.assertEqual(self.run_request(["read"], user_id=2), ["replica_0"])
+        self.assertEqual(self.run_request(["read"]), ["replica_0"])
+        cache.clear()
+        self.assertEqual(self.run_request(["read"], user_id=1), ["replica_0"])
+
+    def test_without_replicas_reads_use_the_primary(self):
+        with mock.patch("backend.db_router.replica_aliases", return_value=[]):
+            self.assertEqual(self.run_request(["read"]), ["default"])
+
+    def test_migrations_only_run_on_the_primary(self):
+        self.assertTrue(self.router.allow_migrate("default", "messaging"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "messaging"))
+
+    def test_jobs_are_read_from_the_primary(self):
+        self.assertEqual(self.run_request(["read"], model=GenerationJob), ["default"])
+
+    def test_warns_about_a_per_process_cache(self):
+        self.assertEqual([w.id for w in check_shared_cache(None)], ["db_router.W001"])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                                                   "LOCATION": "cache"}}):
+            self.assertEqual(check_shared_cache(None), [])
+        with mock.patch("backend.db_router.replica_aliases", return_value=[]):
+            self.assertEqual(check_shared_cache(None), [])
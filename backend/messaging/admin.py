@@ -1,10 +1,21 @@
 from django.contrib import admin
-from .models import Conversation
+from .models import Conversation, GenerationJob
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'title', 'created_at', 'updated_at']
+    list_select_related = ['user']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['title', 'user__email']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['-updated_at']
\ No newline at end of file
+    ordering = ['-updated_at']
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'conversation', 'status', 'error_status', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    # Conversation.__str__ shows its owner's email.
+    list_select_related = ['user', 'conversation__user']
+    search_fields = ['id', 'user__email']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+    ordering = ['-created_at']
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.core import checks
 
 class MessagingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'messaging'
\ No newline at end of file
+    name = 'messaging'
+
+    def ready(self):
+        from backend.db_router import check_shared_cache
+        checks.register(check_shared_cache, checks.Tags.caches)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import gzip
+import os
+from datetime import datetime
+from django.conf import settings
+from . import jsoncodec
+
+# Cold storage for the messages of idle conversations. Each retention run
+# writes one append-only segment file; every conversation in it is a separate
+# gzip member, so a single conversation can be read back by seeking to its
+# offset without decompressing the rest of the segment. The hot store keeps a
+# stub with {"segment", "offset", "length", "count"} under "archived".
+
+
+def _archive_dir():
+    path = str(settings.ARCHIVE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class SegmentWriter:
+    def __init__(self):
+        self.name = f"segment-{datetime.now().strftime('%Y%m%d%H%M%S%f')}.gz"
+        self._file = None
+
+    def write(self, messages):
+        if self._file is None:
+            self._file = open(os.path.join(_archive_dir(), self.name), "ab")
+        data = gzip.compress(jsoncodec.dumps(messages))
+        offset = self._file.tell()
+        self._file.write(data)
+        return {"segment": self.name, "offset": offset, "length": len(data), "count": len(messages)}
+
+    def close(self):
+        # Make the segment durable before stubs pointing into it are written.
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_messages(info):
+    with open(os.path.join(_archive_dir(), info["segment"]), "rb") as f:
+        f.seek(info["offset"])
+        data = f.read(info["length"])
+    return jsoncodec.loads(gzip.decompress(data))
+
+
+def remove_unreferenced_segments(referenced):
+    # Segments whose conversations were all rehydrated (or deleted) are dead weight.
+    removed = []
+    for name in os.listdir(_archive_dir()):
+        if name.startswith("segment-") and name not in referenced:
+            os.remove(os.path.join(_archive_dir(), name))
+            removed.append(name)
+    return removed
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from .circuit_breaker import CircuitOpenError
+from .mistral_functions import UpstreamError
+from .tinydb_store import MessageStore
+
+# Sends many (conversation_id, text) items to the model at once. Items are
+# grouped by conversation: turns of one conversation run in order, since each
+# reply becomes context of the next, while different conversations run
+# concurrently on a bounded thread pool. Wall time then follows the slowest
+# conversation instead of the sum of all items.
+
+
+def _send(index, item):
+    try:
+        content = MessageStore.add_message(item["conversation_id"], item["text"])
+    except CircuitOpenError as e:
+        return {"index": index, "conversation_id": item["conversation_id"], "status": 503,
+                "error": str(e), "retry_after": int(e.retry_after)}
+    except UpstreamError as e:
+        return {"index": index, "conversation_id": item["conversation_id"], "status": 502, "error": str(e)}
+    except Exception as e:
+        return {"index": index, "conversation_id": item["conversation_id"], "status": 500, "error": str(e)}
+    if content is None:
+        return {"index": index, "conversation_id": item["conversation_id"], "status": 404,
+                "error": "Conversation not found"}
+    return {"index": index, "conversation_id": item["conversation_id"], "status": 201, "content": content}
+
+
+def _send_group(group):
+    try:
+        return [_send(index, item) for index, item in group]
+    finally:
+        # Each worker thread opens its own database connections.
+        connections.close_all()
+
+
+def run_batch(items, max_workers=None):
+    """
+    Send every item of `items` (dicts with "conversation_id" and "text") and
+    return one result per item, in input order, with an HTTP-like "status".
+    """
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(item["conversation_id"], []).append((index, item))
+    if not groups:
+        return []
+
+    workers = min(max_workers or settings.BATCH_MAX_WORKERS, len(groups))
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        for group_results in pool.map(_send_group, groups.values()):
+            for result in group_results:
+                results[result["index"]] = result
+    return results
@@ -0,0 +1,86 @@
+import threading
+import time
+
+# Cancellation of in-flight generations. A CancelToken is handed down to the
+# upstream call, which streams the completion and stops reading (closing the
+# HTTP connection) as soon as the token is cancelled. Tokens are registered
+# under keys such as ("job", id) and ("conversation", id) so the cancel
+# endpoint can find them; an optional `check` callback lets a token notice
+# cancellations requested from another process.
+
+
+class GenerationCancelled(Exception):
+    def __init__(self, partial=""):
+        self.partial = partial
+        super().__init__("Generation cancelled")
+
+
+class CancelToken:
+    def __init__(self, check=None, check_interval=1.0):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._check = check
+        self._check_interval = check_interval
+        self._last_check = time.monotonic()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self._check is not None:
+            now = time.monotonic()
+            if now - self._last_check >= self._check_interval:
+                self._last_check = now
+                if self._check():
+                    self.cancel()
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        # Run `callback` on cancellation (right away if already cancelled).
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def register(token, *keys):
+    with _registry_lock:
+        for key in keys:
+            _registry.setdefault(key, set()).add(token)
+
+
+def unregister(token, *keys):
+    with _registry_lock:
+        for key in keys:
+            tokens = _registry.get(key)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del _registry[key]
+
+
+def cancel(key):
+    # Cancel every generation registered under `key`; returns how many were found.
+    with _registry_lock:
+        tokens = list(_registry.get(key, ()))
+    for token in tokens:
+        token.cancel()
+    return len(tokens)
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the breaker is open."""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Upstream '{name}' is unavailable, retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. Calls slower
+    than `latency_threshold` seconds count as failures too, so a hanging
+    upstream trips the breaker before every worker is stuck on it.
+    Open -> half-open once `reset_timeout` seconds have passed; up to
+    `half_open_max_calls` trial calls are let through and the first success
+    closes the circuit again while any failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, latency_threshold=30.0,
+                 reset_timeout=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+        # Counters exposed through snapshot()
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+        self._last_failure = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        # Must be called with the lock held.
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, new_state):
+        if new_state == self._state:
+            return
+        logger.warning("Circuit '%s' %s -> %s", self.name, self._state, new_state)
+        self._state = new_state
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+            self._stats["opened"] += 1
+        elif new_state == HALF_OPEN:
+            self._half_open_calls = 0
+        elif new_state == CLOSED:
+            self._consecutive_failures = 0
+
+    def before_call(self):
+        # Reserve a slot for a call or fail fast with CircuitOpenError.
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+                self._stats["rejected"] += 1
+                retry_after = max(self.reset_timeout - (time.monotonic() - self._opened_at), 1.0)
+                raise CircuitOpenError(self.name, retry_after)
+            if state == HALF_OPEN:
+                self._half_open_calls += 1
+            self._stats["calls"] += 1
+
+    def record_success(self, elapsed):
+        with self._lock:
+            if elapsed > self.latency_threshold:
+                self._stats["slow_calls"] += 1
+                self._record_failure(f"slow call ({elapsed:.1f}s)")
+                return
+            self._stats["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+
+    def record_failure(self, error):
+        with self._lock:
+            self._record_failure(str(error))
+
+    def _record_failure(self, reason):
+        self._stats["failures"] += 1
+        self._consecutive_failures += 1
+        self._last_failure = reason
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def release(self):
+        # Give back a reserved slot for a call that ended neither in success
+        # nor in an upstream failure (e.g. a client-side error).
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def call(self, func, *args, **kwargs):
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._transition(CLOSED)
+            self._half_open_calls = 0
+
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "latency_threshold": self.latency_threshold,
+                "reset_timeout": self.reset_timeout,
+                "last_failure": self._last_failure,
+                **self._stats,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **kwargs):
+    # One breaker per upstream name, shared by every thread of the process.
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **kwargs)
+            _breakers[name] = breaker
+        return breaker
+
+
+def all_breakers():
+    with _breakers_lock:
+        return list(_breakers.values())
@@ -0,0 +1,61 @@
+import logging
+import numpy as np
+import requests
+from django.conf import settings
+from . import vector_index
+from .mistral_functions import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+# Which stored messages accompany a new one to the model. CONTEXT_MODE "full"
+# sends the whole history. "retrieval" sends the last CONTEXT_RECENT_MESSAGES
+# messages plus the CONTEXT_TOP_K older ones most similar to the new message,
+# so prompts stay bounded however long the conversation gets.
+
+
+def _prompt(messages):
+    return [{"role": m["role"], "content": m["content"]} for m in messages if m.get("role") and m.get("content")]
+
+
+def select(conversation_id, messages):
+    """
+    Prompt messages for `messages`, whose last entry is the new message, and
+    the embedding of that message (None unless it was computed).
+    """
+    recent, k = settings.CONTEXT_RECENT_MESSAGES, settings.CONTEXT_TOP_K
+    if settings.CONTEXT_MODE != "retrieval" or len(messages) <= recent + k:
+        return _prompt(messages), None
+
+    cutoff = len(messages) - recent
+    try:
+        query = vector_index.embed_messages(messages[-1:])
+        if query is None:
+            return _prompt(messages[cutoff:]), None
+        # Only the stored history is indexed, not the new message.
+        matrix = vector_index.ensure(conversation_id, messages[:-1], query.shape[1])
+    except (UpstreamError, requests.RequestException, OSError, ValueError):
+        logger.exception("Falling back to the full history for conversation %s", conversation_id)
+        return _prompt(messages), None
+
+    picked = vector_index.top_k(matrix[:cutoff], query[0], k)
+    return _prompt([messages[i] for i in picked] + messages[cutoff:]), query[0]
+
+
+def record(conversation_id, start, new_messages, query=None):
+    # Embed messages stored at positions start, start + 1, ... once; `query`
+    # is the already computed embedding of the first of them.
+    if settings.CONTEXT_MODE != "retrieval":
+        return
+    try:
+        if query is not None:
+            rest = vector_index.embed_messages(new_messages[1:])
+            if rest is None:
+                rest = np.zeros((len(new_messages) - 1, len(query)), dtype=np.float32)
+            vectors = np.vstack([query[None, :], rest])
+        else:
+            vectors = vector_index.embed_messages(new_messages)
+        if vectors is not None:
+            vector_index.append(conversation_id, start, vectors)
+    except (UpstreamError, requests.RequestException, OSError, ValueError):
+        # Missing rows are embedded when the context is next built.
+        logger.exception("Failed to embed messages of conversation %s", conversation_id)
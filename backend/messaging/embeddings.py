@@ -0,0 +1,90 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+import numpy as np
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from . import jsoncodec
+from .mistral_functions import UpstreamError
+
+# Embedders turn texts into L2-normalised float32 vectors, so a dot product
+# is the cosine similarity. EMBEDDER selects one: "mistral" (the embeddings
+# endpoint), "hashing" (local and deterministic, for offline use and tests)
+# or the dotted path of a class with the same interface.
+
+
+class Embedder(ABC):
+
+    @abstractmethod
+    def embed(self, texts):
+        # A (len(texts), dim) float32 array with one unit-length row per text.
+        ...
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class MistralEmbedder(Embedder):
+    BATCH_SIZE = 64
+
+    def __init__(self, url=None, model=None, timeout=None):
+        self.url = url or settings.EMBEDDINGS_URL
+        self.model = model or settings.EMBEDDINGS_MODEL
+        self.timeout = timeout or settings.MISTRAL_TIMEOUT
+
+    def embed(self, texts):
+        headers = {
+            "Authorization": f"Bearer {settings.MISTRAL_API_KEY}",
+            "Content-Type": "application/json",
+        }
+        rows = []
+        for i in range(0, len(texts), self.BATCH_SIZE):
+            payload = {"model": self.model, "input": texts[i:i + self.BATCH_SIZE]}
+            try:
+                response = requests.post(self.url, headers=headers, data=jsoncodec.dumps(payload), timeout=self.timeout)
+            except requests.RequestException as e:
+                raise UpstreamError(f"Embedding request failed: {e}") from e
+            if response.status_code != 200:
+                raise UpstreamError(f"Error {response.status_code}: {response.text}", response.status_code)
+            data = sorted(jsoncodec.loads(response.content)["data"], key=lambda item: item["index"])
+            rows.extend(item["embedding"] for item in data)
+        return _normalize(rows)
+
+
+class HashingEmbedder(Embedder):
+    # Feature hashing of lower-cased words: no model and no network, so the
+    # vectors only capture shared vocabulary, not meaning.
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _features(self, text):
+        for word in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            yield h % self.dim, 1.0 if h >> 63 else -1.0
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for column, sign in self._features(text):
+                vectors[row, column] += sign
+        return _normalize(vectors)
+
+
+EMBEDDERS = {"mistral": MistralEmbedder, "hashing": HashingEmbedder}
+
+_embedders = {}
+
+
+def get_embedder():
+    name = settings.EMBEDDER
+    embedder = _embedders.get(name)
+    if embedder is None:
+        embedder_class = EMBEDDERS.get(name) or import_string(name)
+        embedder = _embedders[name] = embedder_class()
+    return embedder
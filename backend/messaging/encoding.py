@@ -0,0 +1,104 @@
+import base64
+import zlib
+from datetime import datetime, timedelta
+from django.conf import settings
+
+# Storage encoding of messages in the TinyDB store.
+#
+# Version 1 (records without "v"): {"role": ..., "content": ..., "timestamp": ISO string}
+# Version 2: [role, time, body] or [role, time, body, extra]
+#   role  - integer code from ROLE_CODES, or the role string for other roles
+#   time  - microseconds since 1970-01-01 of the naive timestamp, or None
+#   body  - the content, or {"z": base64 zlib data} for bodies at least
+#           MESSAGE_COMPRESS_THRESHOLD bytes long that compress smaller
+#   extra - any other keys of the message, including timestamps that cannot
+#           be stored as an integer without changing their text
+#
+# Reading accepts both versions; writing always produces the current one.
+
+ENCODING_VERSION = 2
+
+ROLE_CODES = {"user": 0, "assistant": 1, "system": 2, "tool": 3}
+ROLE_NAMES = {code: role for role, code in ROLE_CODES.items()}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode_timestamp(value):
+    # Only naive ISO timestamps that survive the round trip unchanged are
+    # converted; anything else is kept verbatim in `extra`.
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def _decode_timestamp(value):
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _encode_body(content):
+    data = content.encode("utf-8")
+    if len(data) < settings.MESSAGE_COMPRESS_THRESHOLD:
+        return content
+    compressed = base64.b64encode(zlib.compress(data, 6)).decode("ascii")
+    # Base64 adds a third, so small or incompressible bodies stay plain.
+    if len(compressed) >= len(data):
+        return content
+    return {"z": compressed}
+
+
+def _decode_body(body):
+    if isinstance(body, dict):
+        return zlib.decompress(base64.b64decode(body["z"])).decode("utf-8")
+    return body
+
+
+def encode_message(message):
+    extra = {k: v for k, v in message.items() if k not in ("role", "content", "timestamp")}
+    role = ROLE_CODES.get(message.get("role"), message.get("role"))
+
+    timestamp = message.get("timestamp")
+    time_value = _encode_timestamp(timestamp)
+    if time_value is None and timestamp is not None:
+        extra["timestamp"] = timestamp
+
+    encoded = [role, time_value, _encode_body(message.get("content") or "")]
+    if extra:
+        encoded.append(extra)
+    return encoded
+
+
+def decode_message(encoded):
+    role, time_value, body = encoded[:3]
+    message = {"role": ROLE_NAMES.get(role, role), "content": _decode_body(body)}
+    if time_value is not None:
+        message["timestamp"] = _decode_timestamp(time_value)
+    if len(encoded) > 3:
+        message.update(encoded[3])
+    return message
+
+
+def encode_messages(messages):
+    return [encode_message(m) for m in messages]
+
+
+def decode_messages(stored, version=1):
+    if version == 1:
+        return stored
+    if version == ENCODING_VERSION:
+        return [decode_message(m) for m in stored]
+    raise ValueError(f"Unknown message encoding version {version}")
+
+
+def upgrade(stored, version=1):
+    # Stored messages in the current encoding, converting older data once.
+    if version == ENCODING_VERSION:
+        return stored
+    return encode_messages(decode_messages(stored, version))
@@ -0,0 +1,124 @@
+from datetime import datetime
+from . import jsoncodec
+from .models import Conversation
+from .store_backends import get_backend
+from .tinydb_store import MessageStore
+
+# Conversations are exported as NDJSON: a header line, then one line per
+# conversation followed by one line per message of that conversation.
+# The export reads the user's stored records in one pass and decodes one
+# conversation at a time; with the TinyDB backend that pass still loads
+# appdata.json and keeps the user's (encoded) records in memory. The import
+# works line by line and holds at most one chunk of messages; if it fails
+# midway, the conversations it already created are deleted again.
+
+EXPORT_VERSION = 1
+IMPORT_CHUNK_SIZE = 500
+
+
+class ImportFormatError(ValueError):
+    def __init__(self, line_number, reason):
+        self.line_number = line_number
+        super().__init__(f"Line {line_number}: {reason}")
+
+
+def _line(record):
+    return jsoncodec.dumps(record).decode("utf-8") + "\n"
+
+
+def _conversation_line(conversation):
+    return _line({
+        "type": "conversation",
+        "id": conversation.id,
+        "title": conversation.title,
+        "created_at": conversation.created_at.isoformat(),
+        "updated_at": conversation.updated_at.isoformat(),
+    })
+
+
+def iter_export(user_id):
+    yield _line({"type": "export", "version": EXPORT_VERSION, "exported_at": datetime.now().isoformat()})
+
+    conversations = {c.id: c for c in Conversation.objects.filter(user_id=user_id).order_by("id")}
+    for record in get_backend().iter_conversations(user_id=user_id):
+        conversation = conversations.pop(record["conversation_id"], None)
+        if conversation is None:
+            # Left behind by a deleted conversation.
+            continue
+        yield _conversation_line(conversation)
+        for message in record["messages"]:
+            yield _line({"type": "message", "conversation_id": conversation.id, **message})
+    # Conversations without stored messages.
+    for conversation in conversations.values():
+        yield _conversation_line(conversation)
+
+
+def import_stream(user_id, lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import an NDJSON export into the account of `user_id`. `lines` may be any
+    iterable of str or bytes lines, e.g. an open file or an uploaded file.
+    Conversations get new IDs; messages are appended in chunks of `chunk_size`.
+    Raises ImportFormatError, after removing what was imported, on bad input.
+    """
+    stats = {"conversations": 0, "messages": 0}
+    id_map = {}
+    created = []
+    current_id = None
+    pending = []
+
+    def flush():
+        if pending:
+            MessageStore.append_messages(current_id, pending, user_id=user_id)
+            stats["messages"] += len(pending)
+            pending.clear()
+
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                try:
+                    line = line.decode("utf-8")
+                except UnicodeDecodeError as e:
+                    raise ImportFormatError(line_number, f"invalid UTF-8 ({e})")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = jsoncodec.loads(line)
+            except ValueError as e:
+                raise ImportFormatError(line_number, f"invalid JSON ({e})")
+            if not isinstance(record, dict):
+                raise ImportFormatError(line_number, "expected a JSON object")
+
+            record_type = record.pop("type", None)
+            if record_type == "export":
+                if record.get("version") != EXPORT_VERSION:
+                    raise ImportFormatError(line_number, f"unsupported export version {record.get('version')}")
+            elif record_type == "conversation":
+                flush()
+                current_id = MessageStore.create_conversation(user_id, title=record.get("title") or "New Chat")
+                id_map[record.get("id")] = current_id
+                created.append(current_id)
+                stats["conversations"] += 1
+            elif record_type == "message":
+                conversation_id = id_map.get(record.pop("conversation_id", None))
+                if conversation_id is None:
+                    raise ImportFormatError(line_number, "message before its conversation")
+                if not isinstance(record.get("role"), str) or not isinstance(record.get("content"), str):
+                    raise ImportFormatError(line_number, "message needs string 'role' and 'content'")
+                if conversation_id != current_id:
+                    flush()
+                    current_id = conversation_id
+                pending.append(record)
+                if len(pending) >= chunk_size:
+                    flush()
+            else:
+                raise ImportFormatError(line_number, f"unknown record type {record_type!r}")
+
+        flush()
+    except BaseException:
+        # All or nothing: a partial import can't be told apart from the
+        # user's own conversations afterwards.
+        for conversation_id in created:
+            MessageStore.delete_conversation(conversation_id)
+        raise
+    return stats
@@ -0,0 +1,140 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from . import cancellation
+from .cancellation import CancelToken, GenerationCancelled
+from .circuit_breaker import CircuitOpenError
+from .mistral_functions import UpstreamError, get_title
+from .models import GenerationJob
+from .tinydb_store import MessageStore
+
+logger = logging.getLogger(__name__)
+
+# Generations run on a process-local worker pool instead of inside the HTTP
+# request. The job row is the source of truth, so a client that disconnected
+# (or hits another process) can still poll for the result; completion events
+# only shorten long-polls served by the process that ran the job.
+
+POLL_INTERVAL = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=settings.GENERATION_WORKERS, thread_name_prefix="generation")
+_events = {}
+_events_lock = threading.Lock()
+
+
+def submit(user_id, conversation_id, text, generate_title=False):
+    job = GenerationJob.objects.create(
+        user_id=user_id, conversation_id=conversation_id, text=text, generate_title=generate_title,
+    )
+    with _events_lock:
+        _events[job.id] = threading.Event()
+    # Only start once the row is visible to the worker's own connection.
+    transaction.on_commit(lambda: _executor.submit(_run, job.id))
+    return job
+
+
+def _finish(job_id, **fields):
+    GenerationJob.objects.filter(id=job_id).update(finished_at=timezone.now(), **fields)
+
+
+def _run(job_id):
+    job = GenerationJob.objects.get(id=job_id)
+    # The DB flag lets a cancel request served by another process reach this worker.
+    token = CancelToken(check=lambda: GenerationJob.objects.filter(id=job_id, cancel_requested=True).exists())
+    keys = (("job", job_id), ("conversation", job.conversation_id))
+    cancellation.register(token, *keys)
+    try:
+        started = GenerationJob.objects.filter(
+            id=job_id, status=GenerationJob.QUEUED, cancel_requested=False,
+        ).update(status=GenerationJob.RUNNING, started_at=timezone.now())
+        if not started:
+            # Cancelled while still queued.
+            return
+        with_title = False
+        if job.generate_title:
+            if settings.COMBINED_TITLE_REPLY:
+                with_title = True
+            else:
+                MessageStore.set_title(job.conversation_id, get_title(job.text))
+
+        result = MessageStore.add_message(job.conversation_id, job.text, with_title=with_title, cancel_token=token)
+        if result is None:
+            _finish(job_id, status=GenerationJob.FAILED, error="Conversation not found", error_status=404)
+        else:
+            _finish(job_id, status=GenerationJob.SUCCEEDED, result=result)
+    except GenerationCancelled as e:
+        _finish(job_id, status=GenerationJob.CANCELLED, result=e.partial)
+    except CircuitOpenError as e:
+        _finish(job_id, status=GenerationJob.FAILED, error=str(e), error_status=503)
+    except UpstreamError as e:
+        _finish(job_id, status=GenerationJob.FAILED, error=str(e), error_status=502)
+    except Exception as e:
+        logger.exception("Generation job %s failed", job_id)
+        _finish(job_id, status=GenerationJob.FAILED, error=str(e), error_status=500)
+    finally:
+        cancellation.unregister(token, *keys)
+        with _events_lock:
+            event = _events.pop(job_id, None)
+        if event is not None:
+            event.set()
+        connections.close_all()
+
+
+def cancel(jobs):
+    # Request cancellation of the unfinished jobs in the `jobs` queryset.
+    # Queued jobs are cancelled right away, running ones stop at their next
+    # streamed chunk. Returns the number of jobs affected.
+    jobs = jobs.exclude(status__in=GenerationJob.FINISHED)
+    job_ids = list(jobs.values_list("id", flat=True))
+    GenerationJob.objects.filter(id__in=job_ids).update(cancel_requested=True)
+    GenerationJob.objects.filter(id__in=job_ids, status=GenerationJob.QUEUED).update(
+        status=GenerationJob.CANCELLED, finished_at=timezone.now(),
+    )
+    for job_id in job_ids:
+        cancellation.cancel(("job", job_id))
+    return len(job_ids)
+
+
+def wait(job, timeout):
+    # Long-poll: return the job once it has finished or `timeout` seconds passed.
+    if not math.isfinite(timeout):
+        # NaN never compares as elapsed and infinity never elapses.
+        raise ValueError(f"timeout must be finite, not {timeout}")
+    deadline = time.monotonic() + timeout
+    while job.status not in GenerationJob.FINISHED:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        with _events_lock:
+            event = _events.get(job.id)
+        if event is not None:
+            event.wait(remaining)
+        else:
+            time.sleep(min(POLL_INTERVAL, remaining))
+        job.refresh_from_db()
+    return job
+
+
+def serialize(job):
+    data = {
+        "job_id": str(job.id),
+        "conversation_id": job.conversation_id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == GenerationJob.SUCCEEDED:
+        data["content"] = job.result
+    elif job.status == GenerationJob.CANCELLED:
+        # Whatever was generated before the cancellation, if anything.
+        data["content"] = job.result or ""
+    elif job.status == GenerationJob.FAILED:
+        data["error"] = job.error
+        data["error_status"] = job.error_status
+    return data
@@ -0,0 +1,71 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# One JSON codec for the hot paths: the TinyDB storage, API responses and
+# request bodies, and payloads to and from the Mistral API. JSON_CODEC picks
+# it: "auto" (orjson when installed, otherwise the standard library),
+# "orjson" or "stdlib". Both produce compact UTF-8 bytes and hand types they
+# can't encode (including datetimes) to `default`, so they are
+# interchangeable. Decode errors are ValueErrors either way.
+
+
+class StdlibCodec:
+    name = "stdlib"
+
+    def dumps(self, obj, default=None):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImproperlyConfigured("JSON_CODEC is 'orjson' but orjson is not installed")
+        self.options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, default=None):
+        return orjson.dumps(obj, default=default, option=self.options)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+CODECS = {"stdlib": StdlibCodec, "orjson": OrjsonCodec}
+
+_codecs = {}
+
+
+def available_codecs():
+    return [name for name in CODECS if name != "orjson" or orjson is not None]
+
+
+def get_codec(name=None):
+    name = name or settings.JSON_CODEC
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+    codec = _codecs.get(name)
+    if codec is None:
+        if name not in CODECS:
+            raise ImproperlyConfigured(f"Unknown JSON_CODEC {name!r}; use auto, orjson or stdlib")
+        codec = _codecs[name] = CODECS[name]()
+    return codec
+
+
+def dumps(obj, default=None):
+    # UTF-8 encoded, compact JSON.
+    return get_codec().dumps(obj, default=default)
+
+
+def loads(data):
+    # `data` may be bytes or str.
+    return get_codec().loads(data)
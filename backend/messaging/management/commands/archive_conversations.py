@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from messaging.models import Conversation
+from messaging.tinydb_store import MessageStore
+
+
+class Command(BaseCommand):
+    help = "Move the messages of idle conversations to compressed archive segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Archive conversations without activity for this many days")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report how many conversations are idle")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        idle_ids = set(Conversation.objects.filter(updated_at__lt=cutoff).values_list("id", flat=True))
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(idle_ids)} conversations idle for more than {options['days']} days.")
+            return
+
+        archived = MessageStore.archive_conversations(idle_ids)
+        removed = MessageStore.remove_unused_archive_segments()
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} conversations, removed {len(removed)} unused segments."
+        ))
@@ -0,0 +1,36 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from messaging.batch import run_batch
+from messaging.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Send a JSON list of {conversation_id, text} items to the model concurrently."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="JSON file with a list of {\"conversation_id\": ..., \"text\": ...}")
+        parser.add_argument("--workers", type=int, default=settings.BATCH_MAX_WORKERS,
+                            help="Maximum concurrent upstream calls")
+
+    def handle(self, *args, **options):
+        with open(options["input"], encoding="utf-8") as f:
+            items = json.load(f)
+        if not isinstance(items, list):
+            raise CommandError("Input must be a JSON list")
+
+        existing = set(Conversation.objects.filter(
+            id__in={item["conversation_id"] for item in items}
+        ).values_list("id", flat=True))
+        missing = {item["conversation_id"] for item in items} - existing
+        if missing:
+            raise CommandError(f"Unknown conversations: {sorted(missing)}")
+
+        start = time.monotonic()
+        results = run_batch(items, max_workers=options["workers"])
+        elapsed = time.monotonic() - start
+
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+        succeeded = sum(1 for result in results if result["status"] == 201)
+        self.stderr.write(f"{succeeded}/{len(results)} items succeeded in {elapsed:.1f}s")
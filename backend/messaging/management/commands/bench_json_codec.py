@@ -0,0 +1,88 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from messaging import encoding, jsoncodec
+from messaging.synthetic import synthetic_conversations
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def payloads(conversations):
+    # The three places JSON is encoded and decoded on every chat turn.
+    return {
+        # The whole TinyDB file, rewritten on every table operation.
+        "storage document": {"conversations": {
+            str(n): {
+                "conversation_id": n,
+                "user_id": n % 10,
+                "title": "Synthetic conversation",
+                "created_at": messages[0]["timestamp"] if messages else "",
+                "v": encoding.ENCODING_VERSION,
+                "messages": encoding.encode_messages(messages),
+            }
+            for n, messages in enumerate(conversations, start=1)
+        }},
+        # GET /messaging/get_messages/ responses.
+        "api responses": [
+            {"conversation_id": n, "messages": messages}
+            for n, messages in enumerate(conversations, start=1)
+        ],
+        # Chat completion requests to the Mistral API.
+        "upstream requests": [
+            {
+                "model": "mistral-small-latest",
+                "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+                "max_tokens": 1000,
+                "temperature": 0.7,
+            }
+            for messages in conversations
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare encode and decode throughput of the JSON codecs on synthetic conversation payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=200)
+        parser.add_argument("--turns", type=int, default=20, help="User/assistant pairs per conversation")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--codecs", default=",".join(jsoncodec.available_codecs()),
+                            help="Comma-separated codecs to compare")
+
+    def handle(self, *args, **options):
+        names = [name for name in options["codecs"].split(",") if name]
+        unknown = [name for name in names if name not in jsoncodec.available_codecs()]
+        if unknown:
+            raise CommandError(f"Unavailable codecs: {', '.join(unknown)}; "
+                               f"installed: {', '.join(jsoncodec.available_codecs())}")
+        codecs = [jsoncodec.get_codec(name) for name in names]
+
+        conversations = synthetic_conversations(options["conversations"], options["turns"], options["seed"])
+        repeat = options["repeat"]
+        self.stdout.write(f"{len(conversations)} conversations, {sum(len(m) for m in conversations)} messages, "
+                          f"best of {repeat} (MB/s)")
+        header = f"{'payload':<20}{'MB':>8}"
+        for codec in codecs:
+            header += f"{codec.name + ' encode':>18}{codec.name + ' decode':>18}"
+        self.stdout.write(header)
+
+        for label, payload in payloads(conversations).items():
+            data = codecs[0].dumps(payload)
+            megabytes = len(data) / 1e6
+            row = f"{label:<20}{megabytes:>8.2f}"
+            for codec in codecs:
+                # Every codec must read what the others write.
+                if codec.loads(data) != payload:
+                    raise CommandError(f"{codec.name} does not round-trip the {label}")
+                encode = best_of(repeat, lambda: codec.dumps(payload))
+                decode = best_of(repeat, lambda: codec.loads(data))
+                row += f"{megabytes / encode:>18.1f}{megabytes / decode:>18.1f}"
+            self.stdout.write(row)
@@ -0,0 +1,67 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from messaging import encoding
+from messaging.synthetic import synthetic_conversations
+from messaging.tinydb_store import MessageStore, conversations_table
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = "Compare storage size and parse time of the plain and the compact message encoding."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=200)
+        parser.add_argument("--turns", type=int, default=20, help="User/assistant pairs per conversation")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--from-store", action="store_true",
+                            help="Use the conversations in the message store instead of synthetic ones")
+
+    def handle(self, *args, **options):
+        if options["from_store"]:
+            conversations = [MessageStore.load_messages(doc) for doc in conversations_table]
+        else:
+            conversations = synthetic_conversations(options["conversations"], options["turns"], options["seed"])
+
+        plain = json.dumps([{"v": 1, "messages": messages} for messages in conversations])
+        compact = json.dumps([{"v": encoding.ENCODING_VERSION, "messages": encoding.encode_messages(messages)}
+                              for messages in conversations])
+
+        def decode_compact():
+            for doc in json.loads(compact):
+                encoding.decode_messages(doc["messages"], doc["v"])
+
+        # What a request pays: TinyDB parses the whole document on every
+        # table operation, but only the requested conversation is decoded.
+        def read_one_compact():
+            doc = json.loads(compact)[-1]
+            encoding.decode_messages(doc["messages"], doc["v"])
+
+        repeat = options["repeat"]
+        plain_parse = best_of(repeat, lambda: json.loads(plain))
+        compact_parse = best_of(repeat, lambda: json.loads(compact))
+        compact_decode = best_of(repeat, decode_compact)
+        compact_read_one = best_of(repeat, read_one_compact)
+        encode = best_of(repeat, lambda: [encoding.encode_messages(m) for m in conversations])
+
+        message_count = sum(len(m) for m in conversations)
+        self.stdout.write(f"{len(conversations)} conversations, {message_count} messages")
+        self.stdout.write(f"{'':<28}{'v1 (plain)':>14}{'v2 (compact)':>14}{'saved':>10}")
+        self.stdout.write(f"{'size (bytes)':<28}{len(plain):>14}{len(compact):>14}"
+                          f"{1 - len(compact) / len(plain):>10.1%}")
+        self.stdout.write(f"{'parse document (ms)':<28}{plain_parse * 1000:>14.2f}{compact_parse * 1000:>14.2f}"
+                          f"{1 - compact_parse / plain_parse:>10.1%}")
+        self.stdout.write(f"{'parse + decode all (ms)':<28}{plain_parse * 1000:>14.2f}{compact_decode * 1000:>14.2f}"
+                          f"{1 - compact_decode / plain_parse:>10.1%}")
+        self.stdout.write(f"{'parse + decode one (ms)':<28}{plain_parse * 1000:>14.2f}{compact_read_one * 1000:>14.2f}"
+                          f"{1 - compact_read_one / plain_parse:>10.1%}")
+        self.stdout.write(f"{'encode all (ms)':<28}{'-':>14}{encode * 1000:>14.2f}")
@@ -0,0 +1,140 @@
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from tinydb import TinyDB
+from messaging import synthetic, tinydb_store
+from messaging.tinydb_store import MessageStore
+
+User = get_user_model()
+
+OPERATIONS = ("create_conversation", "add_message", "get_messages", "get_conversations_by_user")
+
+
+def stub_send_message(messages, model=None, cancel_token=None, usage=None):
+    return f"Synthetic reply to {len(messages)} messages.", datetime.now().isoformat()
+
+
+def stub_send_message_with_title(messages, model=None, cancel_token=None, usage=None):
+    return f"Synthetic reply to {len(messages)} messages.", "Synthetic title", datetime.now().isoformat()
+
+
+def median_ms(operation, arguments):
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        operation(argument)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = ("Time MessageStore operations on growing synthetic datasets and print a scaling table. "
+            "Runs against a temporary store with the upstream stubbed; nothing is kept.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,5000",
+                            help="Comma-separated total numbers of conversations to measure at")
+        parser.add_argument("--users", type=int, default=10, help="Users the conversations are spread over")
+        parser.add_argument("--turns", type=int, default=10, help="User/assistant pairs per conversation")
+        parser.add_argument("--samples", type=int, default=20, help="Timed calls per operation and size")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--backend", default=settings.MESSAGE_STORE_BACKEND,
+                            help="Message store backend to measure")
+        parser.add_argument("--user-words", default=synthetic.DEFAULT_USER_WORDS)
+        parser.add_argument("--reply-words", default=synthetic.DEFAULT_REPLY_WORDS)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options["sizes"].split(",")})
+            for key in ("user_words", "reply_words"):
+                synthetic.parse_distribution(options[key])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not sizes or sizes[0] < 1 or options["users"] < 1 or options["samples"] < 1:
+            raise CommandError("Sizes, --users and --samples must be positive")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = TinyDB(os.path.join(tmp, "appdata.json"), storage=tinydb_store.CodecJSONStorage)
+            try:
+                with override_settings(
+                    MESSAGE_STORE_BACKEND=options["backend"],
+                    SEARCH_INDEX_PATH=os.path.join(tmp, "search.sqlite3"),
+                    VECTOR_DIR=os.path.join(tmp, "vectors"),
+                    ARCHIVE_DIR=os.path.join(tmp, "archive"),
+                ), mock.patch.object(tinydb_store, "conversations_table", db.table("conversations")), \
+                        mock.patch.object(tinydb_store, "send_message", stub_send_message), \
+                        mock.patch.object(tinydb_store, "send_message_with_title", stub_send_message_with_title), \
+                        transaction.atomic():
+                    rows = self.measure(sizes, options, os.path.join(tmp, "appdata.json"))
+                    # Leave no benchmark users or conversations behind.
+                    transaction.set_rollback(True)
+            finally:
+                db.close()
+
+        self.report(rows, options)
+
+    def measure(self, sizes, options, store_path):
+        rng = random.Random(options["seed"])
+        users = [User.objects.create_user(email=f"bench-{options['seed']}-{n}@example.com")
+                 for n in range(options["users"])]
+        conversation_ids = []
+        total = 0
+        rows = []
+        for size in sizes:
+            # Grow the dataset to `size` conversations, spread evenly over the users (not timed).
+            missing = size - total
+            for n, user in enumerate(users):
+                count = missing // len(users) + (1 if n < missing % len(users) else 0)
+                if count > 0:
+                    conversation_ids += synthetic.create_conversations(
+                        user, count, options["turns"], rng, options["user_words"], options["reply_words"])
+            total = max(total, size)
+
+            samples = options["samples"]
+            picked = [rng.choice(conversation_ids) for _ in range(samples)]
+            owners = [users[n % len(users)].id for n in range(samples)]
+            timings = {
+                "create_conversation": median_ms(MessageStore.create_conversation, owners),
+                "add_message": median_ms(lambda cid: MessageStore.add_message(cid, "Benchmark question"), picked),
+                "get_messages": median_ms(MessageStore.get_messages, picked),
+                "get_conversations_by_user": median_ms(MessageStore.get_conversations_by_user, owners),
+            }
+            # The conversations created while timing count towards the next size.
+            total += samples
+            store_size = os.path.getsize(store_path) if os.path.exists(store_path) else None
+            rows.append({"size": size, "store_bytes": store_size, **timings})
+            self.stderr.write(f"measured {size} conversations")
+        return rows
+
+    def report(self, rows, options):
+        messages_per_conversation = options["turns"] * 2
+        self.stdout.write(f"backend {options['backend']}, {options['users']} users, "
+                          f"{messages_per_conversation} messages per conversation, "
+                          f"median of {options['samples']} calls (ms/op)")
+        header = f"{'conversations':>14}{'store MB':>10}" + "".join(f"{name:>28}" for name in OPERATIONS)
+        self.stdout.write(header)
+        for row in rows:
+            store = "-" if row["store_bytes"] is None else f"{row['store_bytes'] / 1e6:.1f}"
+            self.stdout.write(f"{row['size']:>14}{store:>10}" + "".join(f"{row[name]:>28.3f}" for name in OPERATIONS))
+
+        if len(rows) > 1:
+            # k in time ~ n^k between the smallest and the largest size:
+            # about 0 is constant, 1 linear, 2 quadratic.
+            first, last = rows[0], rows[-1]
+            exponents = []
+            for name in OPERATIONS:
+                if first[name] > 0 and last[name] > 0:
+                    exponents.append(math.log(last[name] / first[name]) / math.log(last["size"] / first["size"]))
+                else:
+                    exponents.append(float("nan"))
+            self.stdout.write(f"{'growth n^k':>14}{'':>10}" + "".join(f"{k:>28.2f}" for k in exponents))
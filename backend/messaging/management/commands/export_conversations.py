@@ -0,0 +1,26 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from messaging.export import iter_export
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream a user's conversations and messages as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Email of the user to export")
+        parser.add_argument("--output", "-o", help="Output file (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            raise CommandError(f"User {options['email']} not found")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.writelines(iter_export(user.id))
+            self.stderr.write(self.style.SUCCESS(f"Exported conversations of {user.email} to {options['output']}"))
+        else:
+            sys.stdout.writelines(iter_export(user.id))
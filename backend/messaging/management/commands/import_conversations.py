@@ -0,0 +1,34 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from messaging.export import IMPORT_CHUNK_SIZE, ImportFormatError, import_stream
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import conversations from an NDJSON export into a user's account."
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Email of the user to import into")
+        parser.add_argument("--input", "-i", help="Input file (defaults to stdin)")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                            help="Messages written to the store per batch")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            raise CommandError(f"User {options['email']} not found")
+
+        try:
+            if options["input"]:
+                with open(options["input"], encoding="utf-8") as lines:
+                    stats = import_stream(user.id, lines, chunk_size=options["chunk_size"])
+            else:
+                stats = import_stream(user.id, sys.stdin, chunk_size=options["chunk_size"])
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['conversations']} conversations and {stats['messages']} messages for {user.email}."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from messaging import search_index
+from messaging.store_backends import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text message search index from the message store."
+
+    def handle(self, *args, **options):
+        search_index.clear()
+        conversations = messages = 0
+        for conversation in get_backend().iter_conversations():
+            conversation_messages = conversation["messages"]
+            search_index.index_messages(conversation["conversation_id"], conversation["user_id"], conversation_messages)
+            conversations += 1
+            messages += len(conversation_messages)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {messages} messages from {conversations} conversations."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from messaging import stats
+from messaging.models import Conversation
+from messaging.store_backends import get_backend
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ("Recompute message counts, previews and last-message times of conversations from the message store "
+            "(token totals cannot be recovered and are kept).")
+
+    def handle(self, *args, **options):
+        conversations = {c.id: c for c in Conversation.objects.only("id")}
+        changed = []
+        for record in get_backend().iter_conversations():
+            conversation = conversations.get(record["conversation_id"])
+            if conversation is None:
+                continue
+            messages = record["messages"]
+            conversation.message_count = len(messages)
+            text = next((m.get("content") for m in reversed(messages) if m.get("content")), "")
+            conversation.last_message_preview = stats.preview(text)
+            conversation.last_message_at = stats.message_time(messages[-1]) if messages else None
+            changed.append(conversation)
+
+        fields = ["message_count", "last_message_preview", "last_message_at"]
+        Conversation.objects.bulk_update(changed, fields, batch_size=BATCH_SIZE)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed the stats of {len(changed)} conversations."))
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0002_generationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="cancel_requested",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="generationjob",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("running", "Running"),
+                    ("succeeded", "Succeeded"),
+                    ("failed", "Failed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+    ]
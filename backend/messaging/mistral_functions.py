@@ -1,6 +1,13 @@
 from datetime import datetime
+import json
+import re
+import time
 import requests
 from django.conf import settings
+from . import jsoncodec
+from .cancellation import GenerationCancelled
+from .circuit_breaker import CircuitOpenError, get_breaker
+from .model_router import ModelRouter
 
 MISTRAL_API_KEY = settings.MISTRAL_API_KEY
 API_URL = settings.API_URL
@@ -8,36 +15,171 @@ MAX_TOKENS = settings.MAX_TOKENS
 MAX_TOKENS_TITLE = settings.MAX_TOKENS_TITLE
 TEMPERATURE = settings.TEMPERATURE
 TEMPERATURE_TITLE = settings.TEMPERATURE_TITLE
+MISTRAL_TIMEOUT = settings.MISTRAL_TIMEOUT
+MAX_TITLE_LENGTH = 60
 
-def send_message(messages, model="mistral-small-latest"):
+router = ModelRouter(settings.MODEL_ROUTES)
+
+class UpstreamError(Exception):
+    def __init__(self, message, status_code=None):
+        self.status_code = status_code
+        super().__init__(message)
+
+    @property
+    def is_outage(self):
+        # Network errors, rate limiting and server errors say something about
+        # the upstream's health; other 4xx are problems with our request.
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+def get_model_breaker(model):
+    # One breaker per model so an overloaded model does not block its fallbacks.
+    return get_breaker(
+        f"mistral:{model}",
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        latency_threshold=settings.CIRCUIT_BREAKER_LATENCY_THRESHOLD,
+        reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+        half_open_max_calls=settings.CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS,
+    )
+
+def _read_stream(response, cancel_token):
+    # Collect a streamed (server-sent events) completion into the shape of a
+    # regular response. Cancelling the token closes the connection, which
+    # also interrupts a read that is waiting for the next chunk.
+    parts = []
+    usage = None
+    cancel_token.on_cancel(response.close)
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if cancel_token.cancelled:
+                break
+            if not line or not line.startswith("data:"):
+                continue
+            chunk = line[len("data:"):].strip()
+            if chunk == "[DONE]":
+                break
+            event = jsoncodec.loads(chunk)
+            usage = event.get("usage") or usage
+            for choice in event.get("choices", []):
+                parts.append(choice.get("delta", {}).get("content") or "")
+    except Exception:
+        if not cancel_token.cancelled:
+            raise
+    finally:
+        cancel_token.remove_callback(response.close)
+        response.close()
+
+    if cancel_token.cancelled:
+        raise GenerationCancelled("".join(parts))
+    return {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}], "usage": usage}
+
+def _check_completion(data):
+    # Raises unless `data` has the shape of a chat completion.
+    if not isinstance(data["choices"][0]["message"]["content"], str):
+        raise ValueError("message content is not a string")
+
+def _post(payload, timeout=MISTRAL_TIMEOUT, cancel_token=None):
+    # With a cancel token the completion is streamed so it can be abandoned
+    # midway; otherwise it is read in one response.
     headers = {
         "Authorization": f"Bearer {MISTRAL_API_KEY}",
         "Content-Type": "application/json",
     }
+    stream = cancel_token is not None
+    if stream:
+        if cancel_token.cancelled:
+            raise GenerationCancelled()
+        payload = {**payload, "stream": True}
+
+    breaker = get_model_breaker(payload["model"])
+    breaker.before_call()
+    start = time.monotonic()
+    try:
+        response = requests.post(API_URL, headers=headers, data=jsoncodec.dumps(payload), timeout=timeout, stream=stream)
+    except requests.RequestException as e:
+        breaker.record_failure(e)
+        router.record(payload["model"], time.monotonic() - start, ok=False)
+        raise UpstreamError(f"Upstream request failed: {e}") from e
+
+    elapsed = time.monotonic() - start
+    if response.status_code != 200:
+        error = UpstreamError(f"Error {response.status_code}: {response.text}", response.status_code)
+        if error.is_outage:
+            breaker.record_failure(error)
+            router.record(payload["model"], elapsed, ok=False)
+        else:
+            breaker.release()
+        raise error
 
+    if stream:
+        # For streams the time to the response headers is the health signal;
+        # the length of the generation says nothing about the upstream.
+        try:
+            data = _read_stream(response, cancel_token)
+        except GenerationCancelled:
+            breaker.release()
+            raise
+        except (requests.RequestException, ValueError) as e:
+            breaker.record_failure(e)
+            router.record(payload["model"], elapsed, ok=False)
+            raise UpstreamError(f"Upstream stream failed: {e}") from e
+    else:
+        try:
+            data = jsoncodec.loads(response.content)
+            _check_completion(data)
+        except (ValueError, LookupError, TypeError) as e:
+            # E.g. an error page from a proxy, or JSON without a completion;
+            # also ends a half-open trial.
+            breaker.record_failure(e)
+            router.record(payload["model"], elapsed, ok=False)
+            raise UpstreamError(f"Invalid upstream response: {e!r}") from e
+
+    breaker.record_success(elapsed)
+    router.record(payload["model"], elapsed, ok=True)
+    return data
+
+def _complete(task, payload, model=None, cancel_token=None):
+    # Try the models routed for `task` in order, failing over on outages
+    # (429/5xx, timeouts, open circuits). An explicit `model` bypasses routing.
+    if model is not None:
+        candidates = [{"model": model, "timeout": MISTRAL_TIMEOUT}]
+    else:
+        candidates = router.candidates(task)
+
+    last_error = None
+    for entry in candidates:
+        try:
+            return _post({**payload, "model": entry["model"]}, timeout=entry["timeout"], cancel_token=cancel_token)
+        except CircuitOpenError as e:
+            # Report the soonest retry if every candidate is open.
+            if last_error is None or (isinstance(last_error, CircuitOpenError)
+                                      and e.retry_after < last_error.retry_after):
+                last_error = e
+        except UpstreamError as e:
+            if not e.is_outage:
+                raise
+            last_error = e
+    raise last_error
+
+def _record_usage(data, usage):
+    # Copy the token counts the API reported into the caller's `usage` dict.
+    if usage is not None:
+        usage.update(data.get("usage") or {})
+
+def send_message(messages, model=None, cancel_token=None, usage=None):
     payload = {
-        "model": model,
         "messages": [{"role": "system", "content": "You are a helpful assistant."}] + messages,
         "temperature": TEMPERATURE,
         "max_tokens": MAX_TOKENS
     }
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    data = _complete("chat", payload, model=model, cancel_token=cancel_token)
+    _record_usage(data, usage)
+    return data["choices"][0]["message"]["content"], datetime.now().isoformat()
 
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"], datetime.now().isoformat()
-    else:
-        raise Exception(f"Error {response.status_code}: {response.text}")
-
-def get_title(message, model="mistral-small-latest"):
-    headers = {
-        "Authorization": f"Bearer {MISTRAL_API_KEY}",
-        "Content-Type": "application/json",
-    }
+def get_title(message, model=None):
     prompt = "Generate a concise title for the following conversation:\n"
 
     payload = {
-        "model": model,
         "messages": [{"role": "system", "content": prompt},
                      {"role": "user", "content": message}],
 
@@ -45,12 +187,95 @@ def get_title(message, model="mistral-small-latest"):
         "max_tokens": MAX_TOKENS_TITLE
     }
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    data = _complete("title", payload, model=model)
+    title = data["choices"][0]["message"]["content"]
+    # Strip surrounding quotes if present
+    title = title.strip().strip('"').strip("'")
+    return title
+
+def fallback_title(message):
+    # Title derived locally from the first user message when the model gave none.
+    words = message.strip().split("\n", 1)[0].split()
+    title = " ".join(words[:6])
+    if len(title) > MAX_TITLE_LENGTH:
+        title = title[:MAX_TITLE_LENGTH].rsplit(" ", 1)[0]
+    return title or "New Chat"
+
+def parse_title_and_reply(content, first_message):
+    # Models in JSON mode occasionally wrap the object in prose or code fences,
+    # so fall back to the outermost braces before giving up on the JSON.
+    parsed = None
+    candidates = [content]
+    start, end = content.find("{"), content.rfind("}")
+    if 0 <= start < end:
+        candidates.append(content[start:end + 1])
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+            break
+        except ValueError:
+            continue
+
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("reply"), str):
+        return content, fallback_title(first_message)
 
-    if response.status_code == 200:
-        title = response.json()["choices"][0]["message"]["content"]
-        # Strip surrounding quotes if present
-        title = title.strip().strip('"').strip("'")
-        return title
+    title = parsed.get("title")
+    if isinstance(title, str) and title.strip():
+        title = title.strip().strip('"').strip("'")[:MAX_TITLE_LENGTH]
     else:
-        raise Exception(f"Error {response.status_code}: {response.text}")
\ No newline at end of file
+        title = fallback_title(first_message)
+    return parsed["reply"], title
+
+_REPLY_START = re.compile(r'"reply"\s*:\s*"')
+# A \uXXXX escape cut off before its fourth digit (not preceded by an escaped backslash).
+_CUT_UNICODE_ESCAPE = re.compile(r'(?<!\\)((?:\\\\)*)\\u[0-9a-fA-F]{0,3}$')
+
+def partial_reply(content):
+    # The reply text of a JSON-mode completion that was cut off midway, e.g.
+    # '{"reply": "Hel' -> 'Hel'. Empty if the reply had not started yet.
+    if "{" not in content:
+        return content
+    match = _REPLY_START.search(content)
+    if match is None:
+        return ""
+    raw = []
+    escaped = False
+    for char in content[match.end():]:
+        if char == '"' and not escaped:
+            break
+        escaped = char == "\\" and not escaped
+        raw.append(char)
+    raw = "".join(raw[:-1] if escaped else raw)
+    raw = _CUT_UNICODE_ESCAPE.sub(r"\1", raw)
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+def send_message_with_title(messages, model=None, cancel_token=None, usage=None):
+    # First turn of a conversation: one JSON-mode completion returns both the
+    # reply and the conversation title instead of a separate get_title() call.
+    prompt = (
+        "You are a helpful assistant. Answer the user's message and name the conversation. "
+        "Respond only with a JSON object with two string keys: "
+        '"reply", your complete answer to the user, and '
+        '"title", a concise title for the conversation of at most six words.'
+    )
+
+    payload = {
+        "messages": [{"role": "system", "content": prompt}] + messages,
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS,
+        "response_format": {"type": "json_object"},
+    }
+
+    try:
+        data = _complete("chat", payload, model=model, cancel_token=cancel_token)
+    except GenerationCancelled as e:
+        # Store what the user saw of the reply, not the JSON it was wrapped in.
+        raise GenerationCancelled(partial_reply(e.partial)) from e
+    _record_usage(data, usage)
+    content = data["choices"][0]["message"]["content"]
+    first_message = next((m["content"] for m in messages if m["role"] == "user"), "")
+    reply, title = parse_title_and_reply(content, first_message)
+    return reply, title, datetime.now().isoformat()
@@ -0,0 +1,94 @@
+import threading
+import time
+
+# Weight of the newest sample in the moving latency average.
+EWMA_ALPHA = 0.2
+# A model whose average latency exceeds this share of its timeout is
+# considered degraded and moved behind the healthy models of its route.
+DEGRADED_LATENCY_RATIO = 0.8
+# How long a failure keeps a model demoted.
+FAILURE_COOLDOWN = 60.0
+
+
+class ModelStats:
+    def __init__(self):
+        self.samples = 0
+        self.ewma_latency = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_failure_at = None
+
+    def record(self, elapsed, ok):
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_failure_at = time.monotonic()
+        # Timeouts are recorded with their elapsed time so slow models show up
+        # in the average even when they never answer.
+        self.samples += 1
+        if self.ewma_latency is None:
+            self.ewma_latency = elapsed
+        else:
+            self.ewma_latency = EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.ewma_latency
+
+    def recently_failed(self):
+        return (self.consecutive_failures > 0
+                and time.monotonic() - self.last_failure_at < FAILURE_COOLDOWN)
+
+    def as_dict(self):
+        return {
+            "samples": self.samples,
+            "ewma_latency": self.ewma_latency,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class ModelRouter:
+    """
+    Maps a task ("chat", "title", ...) to the models that may serve it.
+    Routes are lists of {"model": name, "timeout": seconds} in order of
+    preference. candidates() keeps that order for healthy models and moves
+    models that recently failed or run close to their timeout to the back,
+    fastest first.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def candidates(self, task):
+        if not self.routes.get(task):
+            raise KeyError(f"No model route configured for task '{task}'")
+        healthy, degraded = [], []
+        with self._lock:
+            for entry in self.routes[task]:
+                stats = self._get_stats(entry["model"])
+                slow = (stats.ewma_latency is not None
+                        and stats.ewma_latency > entry["timeout"] * DEGRADED_LATENCY_RATIO)
+                if stats.recently_failed() or slow:
+                    degraded.append((stats.consecutive_failures, stats.ewma_latency or 0.0, entry))
+                else:
+                    healthy.append(entry)
+        degraded.sort(key=lambda item: item[:2])
+        return healthy + [entry for _, _, entry in degraded]
+
+    def record(self, model, elapsed, ok):
+        with self._lock:
+            self._get_stats(model).record(elapsed, ok)
+
+    def snapshot(self):
+        with self._lock:
+            return {model: stats.as_dict() for model, stats in self._stats.items()}
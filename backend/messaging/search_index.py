@@ -0,0 +1,147 @@
+import html
+import re
+import sqlite3
+import threading
+from django.conf import settings
+
+# Message bodies live in TinyDB, which can only be scanned. This module keeps
+# an SQLite FTS5 index next to it that is updated incrementally on every
+# add_message(), so search cost depends on the number of hits rather than on
+# the size of the history.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    role TEXT NOT NULL,
+    timestamp TEXT,
+    content TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_conversation_position
+    ON messages (conversation_id, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    content, owner,
+    content='messages', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO message_fts (rowid, content, owner) VALUES (new.id, new.content, new.owner);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO message_fts (message_fts, rowid, content, owner) VALUES ('delete', old.id, old.content, old.owner);
+END;
+"""
+
+SNIPPET_TOKENS = 12
+
+# snippet() marks the matches with these and the text is HTML-escaped before
+# they are turned into <mark> tags, so message content is never markup.
+# Private use code points: a message containing them at worst gets a stray
+# <mark>, never other markup.
+_MARK_START, _MARK_END = "\ue000", "\ue001"
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _connection():
+    path = str(settings.SEARCH_INDEX_PATH)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if path not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready.add(path)
+        connections[path] = conn
+    return conn
+
+
+def _owner(user_id):
+    # Stored as an indexed token so the per-user filter is part of the FTS
+    # match instead of a post-filter over every hit.
+    return f"u{user_id}"
+
+
+def index_messages(conversation_id, user_id, messages, start=0):
+    # Index `messages`, the first of which sits at position `start` in the
+    # conversation. Re-indexing a position replaces the previous entry.
+    rows = [
+        (conversation_id, start + i, _owner(user_id), m.get("role", ""), m.get("timestamp"), m.get("content") or "")
+        for i, m in enumerate(messages)
+    ]
+    conn = _connection()
+    with conn:
+        conn.executemany(
+            "DELETE FROM messages WHERE conversation_id = ? AND position = ?",
+            [(row[0], row[1]) for row in rows],
+        )
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, position, owner, role, timestamp, content) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def remove_conversation(conversation_id):
+    conn = _connection()
+    with conn:
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+
+
+def clear():
+    conn = _connection()
+    with conn:
+        conn.execute("DELETE FROM messages")
+        conn.execute("INSERT INTO message_fts (message_fts) VALUES ('rebuild')")
+
+
+def build_match_query(query, user_id):
+    # Every word of the query must match; the last one also matches as a
+    # prefix so results show up while the user is still typing. Words are
+    # quoted so FTS5 operators in user input are taken literally.
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'owner:"{_owner(user_id)}" AND content:({" ".join(quoted)})'
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet, quote=False)
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def search(user_id, query, limit=20, offset=0):
+    # Returns (hits, has_more), best matches first.
+    match = build_match_query(query, user_id)
+    if match is None:
+        return [], False
+    rows = _connection().execute(
+        "SELECT m.conversation_id, m.position, m.role, m.timestamp, "
+        "snippet(message_fts, 0, ?, ?, '…', ?), bm25(message_fts, 1.0, 0.0) AS score "
+        "FROM message_fts JOIN messages m ON m.id = message_fts.rowid "
+        "WHERE message_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+        (_MARK_START, _MARK_END, SNIPPET_TOKENS, match, limit + 1, offset),
+    ).fetchall()
+    hits = [
+        {
+            "conversation_id": conversation_id,
+            "position": position,
+            "role": role,
+            "timestamp": timestamp,
+            "snippet": _highlight(snippet),
+            "score": -score,
+        }
+        for conversation_id, position, role, timestamp, snippet, score in rows[:limit]
+    ]
+    return hits, len(rows) > limit
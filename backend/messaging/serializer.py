@@ -4,5 +4,7 @@ from .models import Conversation
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
-        fields = ['id', 'title', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'title', 'created_at', 'updated_at',
+                  'message_count', 'last_message_preview', 'last_message_at', 'total_tokens']
+        read_only_fields = ['id', 'created_at', 'updated_at',
+                            'message_count', 'last_message_preview', 'last_message_at', 'total_tokens']
\ No newline at end of file
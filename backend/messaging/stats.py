@@ -0,0 +1,47 @@
+from datetime import datetime
+from django.db.models import F
+from django.utils import timezone
+
+# Per-conversation listing stats kept on Conversation, so the sidebar never
+# needs the message bodies. They are updated with F() expressions in the same
+# query that bumps updated_at, which keeps concurrent turns from losing counts.
+
+PREVIEW_LENGTH = 200
+
+
+def preview(text):
+    text = " ".join((text or "").split())
+    if len(text) <= PREVIEW_LENGTH:
+        return text
+    return text[:PREVIEW_LENGTH - 1].rstrip() + "…"
+
+
+def message_time(message):
+    # Aware datetime of a stored message's timestamp, or None.
+    try:
+        value = datetime.fromisoformat(message.get("timestamp") or "")
+    except (TypeError, ValueError):
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def appended(messages, tokens=0, at=None):
+    """
+    Conversation.objects.update() arguments for `messages` having been added
+    to a conversation at `at` (default: the time of the last of them, or now),
+    using `tokens` completion tokens.
+    """
+    now = timezone.now()
+    fields = {
+        "updated_at": now,
+        "message_count": F("message_count") + len(messages),
+        "last_message_at": at or (message_time(messages[-1]) if messages else None) or now,
+    }
+    text = next((m.get("content") for m in reversed(messages) if m.get("content")), None)
+    if text is not None:
+        fields["last_message_preview"] = preview(text)
+    if tokens:
+        fields["total_tokens"] = F("total_tokens") + tokens
+    return fields
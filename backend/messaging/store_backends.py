@@ -0,0 +1,171 @@
+import threading
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Storage of conversation records and their messages, behind MessageStore.
+# MESSAGE_STORE_BACKEND selects the backend: "tinydb" (appdata.json), "memory"
+# (per process, for tests and benchmarks) or the dotted path of a
+# StoreBackend subclass. Every backend must pass the conformance tests in
+# messaging/tests/test_backends.py.
+#
+# A conversation record is a dict with "conversation_id", "user_id", "title"
+# and "created_at"; get() and iter_conversations() add its "messages". Messages
+# are dicts with "role", "content", usually "timestamp", and any extra keys,
+# which must be stored unchanged. Returned records and lists are copies.
+
+
+class StoreBackend(ABC):
+
+    @abstractmethod
+    def create(self, conversation_id, user_id, title, created_at):
+        # Store a new, empty conversation.
+        ...
+
+    @abstractmethod
+    def get(self, conversation_id):
+        # The record with its messages, or None if it doesn't exist.
+        ...
+
+    @abstractmethod
+    def page(self, conversation_id, offset=0, limit=None):
+        # (messages[offset:offset + limit], total number of messages), or None if
+        # the conversation doesn't exist. A negative offset counts from the end.
+        ...
+
+    @abstractmethod
+    def append(self, conversation_id, messages):
+        # Append `messages` atomically. Returns the position of the first of
+        # them, or None if the conversation doesn't exist.
+        ...
+
+    @abstractmethod
+    def list_conversations(self, user_id):
+        # Records (without messages) of the conversations of `user_id`.
+        ...
+
+    @abstractmethod
+    def set_title(self, conversation_id, title):
+        ...
+
+    @abstractmethod
+    def delete(self, conversation_id):
+        ...
+
+    @abstractmethod
+    def iter_conversations(self, user_id=None):
+        # Every record with its messages (only those of `user_id` if given),
+        # e.g. to rebuild derived indexes or export an account.
+        ...
+
+    def bulk_load(self, records):
+        # Store complete records (conversation fields plus "messages") at once,
+        # e.g. generated datasets. Backends can override this with a faster path.
+        for record in records:
+            self.create(record["conversation_id"], record["user_id"], record["title"], record["created_at"])
+            self.append(record["conversation_id"], record["messages"])
+
+    def archive(self, conversation_ids):
+        # Move the messages of idle conversations to cold storage; returns how
+        # many were moved. Backends without cold storage keep everything.
+        return 0
+
+    def remove_unused_archive_segments(self):
+        # Delete the cold storage files no conversation refers to any more;
+        # returns the list of their names (empty for backends without any).
+        return []
+
+
+def page_slice(messages, offset, limit):
+    # messages[offset:offset + limit] where a negative offset counts from the end.
+    if offset < 0:
+        offset = max(len(messages) + offset, 0)
+    end = None if limit is None else offset + limit
+    return messages[offset:end]
+
+
+class InMemoryBackend(StoreBackend):
+    # Plain dicts in this process. Nothing survives a restart.
+
+    def __init__(self):
+        self._conversations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _record(conversation):
+        return {k: v for k, v in conversation.items() if k != "messages"}
+
+    def create(self, conversation_id, user_id, title, created_at):
+        with self._lock:
+            self._conversations[conversation_id] = {
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "title": title,
+                "created_at": created_at,
+                "messages": [],
+            }
+
+    def get(self, conversation_id):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            return {**self._record(conversation), "messages": [dict(m) for m in conversation["messages"]]}
+
+    def page(self, conversation_id, offset=0, limit=None):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            messages = conversation["messages"]
+            return [dict(m) for m in page_slice(messages, offset, limit)], len(messages)
+
+    def append(self, conversation_id, messages):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return None
+            start = len(conversation["messages"])
+            conversation["messages"].extend(dict(m) for m in messages)
+            return start
+
+    def list_conversations(self, user_id):
+        with self._lock:
+            return [self._record(c) for c in self._conversations.values() if c["user_id"] == user_id]
+
+    def set_title(self, conversation_id, title):
+        with self._lock:
+            if conversation_id in self._conversations:
+                self._conversations[conversation_id]["title"] = title
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def iter_conversations(self, user_id=None):
+        with self._lock:
+            ids = [cid for cid, c in self._conversations.items() if user_id is None or c["user_id"] == user_id]
+        for conversation_id in ids:
+            conversation = self.get(conversation_id)
+            if conversation is not None:
+                yield conversation
+
+
+BACKENDS = {
+    "tinydb": "messaging.tinydb_store.TinyDBBackend",
+    "memory": "messaging.store_backends.InMemoryBackend",
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    name = settings.MESSAGE_STORE_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = _backends[name] = import_string(BACKENDS.get(name, name))()
+    return backend
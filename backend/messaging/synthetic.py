@@ -0,0 +1,121 @@
+import math
+import random
+from datetime import datetime, timedelta
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from . import search_index, stats
+from .models import Conversation
+from .store_backends import get_backend
+
+# Reproducible synthetic data for benchmarks and load tests. The same seed and
+# options always give the same users, titles, messages and timestamps.
+
+User = get_user_model()
+
+WORDS = ("the model answer context token request python django message store conversation "
+         "latency index search archive vector response upstream title user assistant").split()
+
+START = datetime(2025, 1, 1)
+
+# Words per message. User turns are short; assistant replies follow a
+# long-tailed distribution up to roughly MAX_TOKENS worth of text.
+DEFAULT_USER_WORDS = "uniform:5:60"
+DEFAULT_REPLY_WORDS = "lognormal:5.5:1.0"
+MAX_WORDS = 3000
+
+
+def parse_distribution(spec, max_words=MAX_WORDS):
+    """
+    A function of a random.Random returning a word count, from "fixed:N",
+    "uniform:LOW:HIGH" or "lognormal:MU:SIGMA" (capped at `max_words`).
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(a) for a in args.split(":")] if args else []
+    except ValueError:
+        values = None
+    if values is not None and all(math.isfinite(v) for v in values):
+        if kind == "fixed" and len(values) == 1 and values[0] >= 0:
+            n = int(values[0])
+            return lambda rng: n
+        if kind == "uniform" and len(values) == 2 and 0 <= values[0] <= values[1]:
+            low, high = int(values[0]), int(values[1])
+            return lambda rng: rng.randint(low, high)
+        if kind == "lognormal" and len(values) == 2 and values[1] >= 0:
+            mu, sigma = values
+            return lambda rng: max(1, min(int(rng.lognormvariate(mu, sigma)), max_words))
+    raise ValueError(f"Invalid length distribution {spec!r}; use fixed:N, uniform:LOW:HIGH or lognormal:MU:SIGMA")
+
+
+def synthetic_messages(rng, turns, user_words, reply_words, start=START):
+    messages = []
+    ts = start + timedelta(seconds=rng.randrange(10_000_000))
+    for _ in range(turns):
+        for role, words in (("user", user_words(rng)), ("assistant", reply_words(rng))):
+            ts += timedelta(seconds=rng.randint(1, 120), microseconds=rng.randrange(1_000_000))
+            messages.append({
+                "role": role,
+                "content": " ".join(rng.choice(WORDS) for _ in range(words)),
+                "timestamp": ts.isoformat(),
+            })
+    return messages
+
+
+def synthetic_conversations(count, turns, seed, user_words=DEFAULT_USER_WORDS, reply_words=DEFAULT_REPLY_WORDS):
+    # Message lists only, without users or stored records.
+    rng = random.Random(seed)
+    user_words, reply_words = parse_distribution(user_words), parse_distribution(reply_words)
+    return [synthetic_messages(rng, turns, user_words, reply_words) for _ in range(count)]
+
+
+def create_conversations(user, count, turns, rng, user_words, reply_words, index=True):
+    """
+    Store `count` synthetic conversations of `user` in both the Conversation
+    table and the message store, in bulk. Returns their IDs.
+    """
+    backend = get_backend()
+    user_words, reply_words = parse_distribution(user_words), parse_distribution(reply_words)
+    pending = []
+    for _ in range(count):
+        messages = synthetic_messages(rng, turns, user_words, reply_words)
+        conversation = Conversation(user=user, title=" ".join(rng.choice(WORDS) for _ in range(4)).capitalize())
+        if messages:
+            conversation.message_count = len(messages)
+            conversation.last_message_preview = stats.preview(messages[-1]["content"])
+            conversation.last_message_at = stats.message_time(messages[-1])
+        pending.append((conversation, messages))
+
+    with transaction.atomic():
+        Conversation.objects.bulk_create([conversation for conversation, _ in pending])
+    backend.bulk_load([
+        {
+            "conversation_id": conversation.id,
+            "user_id": user.id,
+            "title": conversation.title,
+            "created_at": conversation.created_at.isoformat(),
+            "messages": messages,
+        }
+        for conversation, messages in pending
+    ])
+    if index:
+        for conversation, messages in pending:
+            search_index.index_messages(conversation.id, user.id, messages)
+    return [conversation.id for conversation, _ in pending]
+
+
+def create_tenants(users, conversations, turns, seed, user_words=DEFAULT_USER_WORDS,
+                   reply_words=DEFAULT_REPLY_WORDS, prefix="synthetic", password=None, index=True):
+    """
+    Create `users` users named <prefix>-<seed>-<n>@example.com with
+    `conversations` conversations of `turns` turns each. Returns the users.
+    """
+    rng = random.Random(seed)
+    created = []
+    for n in range(users):
+        # Without a password the account cannot log in.
+        user = User.objects.create_user(
+            email=f"{prefix}-{seed}-{n}@example.com", password=password, email_verified=True,
+        )
+        create_conversations(user, conversations, turns, rng, user_words, reply_words, index=index)
+        created.append(user)
+    return created
@@ -0,0 +1,268 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+from messaging import archive, tinydb_store
+from messaging.store_backends import InMemoryBackend, get_backend
+from messaging.tinydb_store import TinyDBBackend
+
+# Operations timed by the microbenchmarks; raise BACKEND_BENCH_SCALE to
+# compare backends on larger data.
+BENCH_SCALE = int(os.getenv("BACKEND_BENCH_SCALE", "1"))
+
+
+def message(i, role="user", **extra):
+    return {"role": role, "content": f"message {i}", "timestamp": f"2025-01-01T12:00:{i % 60:02d}", **extra}
+
+
+class BackendConformanceMixin:
+    # Behaviour every StoreBackend must have. Subclasses provide make_backend().
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        self.backend = self.make_backend()
+
+    def create(self, conversation_id=1, user_id=10, title="Chat"):
+        self.backend.create(conversation_id, user_id, title, "2025-01-01T12:00:00+00:00")
+        return conversation_id
+
+    def test_create_and_get(self):
+        self.create(1, user_id=10, title="Hello")
+        record = self.backend.get(1)
+        self.assertEqual(record["conversation_id"], 1)
+        self.assertEqual(record["user_id"], 10)
+        self.assertEqual(record["title"], "Hello")
+        self.assertEqual(record["created_at"], "2025-01-01T12:00:00+00:00")
+        self.assertEqual(record["messages"], [])
+
+    def test_missing_conversation(self):
+        self.assertIsNone(self.backend.get(404))
+        self.assertIsNone(self.backend.page(404))
+        self.assertIsNone(self.backend.append(404, [message(0)]))
+
+    def test_append_returns_positions(self):
+        self.create()
+        self.assertEqual(self.backend.append(1, [message(0), message(1, "assistant")]), 0)
+        self.assertEqual(self.backend.append(1, [message(2)]), 2)
+        self.assertEqual(self.backend.get(1)["messages"], [message(0), message(1, "assistant"), message(2)])
+
+    def test_messages_round_trip(self):
+        self.create()
+        messages = [
+            message(0),
+            {"role": "assistant", "content": "partial", "timestamp": "2025-01-01T12:00:01", "status": "cancelled"},
+            {"role": "system", "content": "x" * 5000, "timestamp": "2025-01-01T12:00:02.123456"},
+            {"role": "tool", "content": "no timestamp"},
+            {"role": "assistant", "content": "", "timestamp": "2025-01-01T12:00:03+02:00"},
+        ]
+        self.backend.append(1, messages)
+        self.assertEqual(self.backend.get(1)["messages"], messages)
+
+    def test_page(self):
+        self.create()
+        messages = [message(i) for i in range(10)]
+        self.backend.append(1, messages)
+        self.assertEqual(self.backend.page(1), (messages, 10))
+        self.assertEqual(self.backend.page(1, offset=2, limit=3), (messages[2:5], 10))
+        self.assertEqual(self.backend.page(1, offset=-4, limit=2), (messages[6:8], 10))
+        self.assertEqual(self.backend.page(1, offset=-20, limit=2), (messages[:2], 10))
+        self.assertEqual(self.backend.page(1, offset=8, limit=5), (messages[8:], 10))
+        self.assertEqual(self.backend.page(1, offset=12), ([], 10))
+
+    def test_list_conversations(self):
+        self.create(1, user_id=10, title="a")
+        self.create(2, user_id=11, title="b")
+        self.create(3, user_id=10, title="c")
+        self.backend.append(1, [message(0)])
+        records = sorted(self.backend.list_conversations(10), key=lambda r: r["conversation_id"])
+        self.assertEqual([r["conversation_id"] for r in records], [1, 3])
+        self.assertEqual([r["title"] for r in records], ["a", "c"])
+        self.assertNotIn("messages", records[0])
+        self.assertEqual(self.backend.list_conversations(12), [])
+
+    def test_set_title(self):
+        self.create()
+        self.backend.set_title(1, "Renamed")
+        self.assertEqual(self.backend.get(1)["title"], "Renamed")
+        self.backend.set_title(404, "Nothing")
+
+    def test_delete(self):
+        self.create(1)
+        self.create(2)
+        self.backend.append(1, [message(0)])
+        self.backend.delete(1)
+        self.assertIsNone(self.backend.get(1))
+        self.assertIsNotNone(self.backend.get(2))
+        self.backend.delete(1)
+
+    def test_iter_conversations(self):
+        self.create(1, user_id=10)
+        self.create(2, user_id=11)
+        self.backend.append(2, [message(0)])
+        records = sorted(self.backend.iter_conversations(), key=lambda r: r["conversation_id"])
+        self.assertEqual([(r["conversation_id"], r["user_id"]) for r in records], [(1, 10), (2, 11)])
+        self.assertEqual(records[1]["messages"], [message(0)])
+        self.assertEqual([r["conversation_id"] for r in self.backend.iter_conversations(user_id=11)], [2])
+
+    def test_returned_data_is_a_copy(self):
+        self.create()
+        self.backend.append(1, [message(0)])
+        record = self.backend.get(1)
+        record["messages"].append(message(1))
+        record["messages"][0]["content"] = "changed"
+        self.backend.page(1)[0].clear()
+        self.assertEqual(self.backend.get(1)["messages"], [message(0)])
+
+    def test_archive_keeps_messages_readable(self):
+        self.create(1)
+        self.create(2)
+        self.backend.append(1, [message(0), message(1)])
+        self.backend.archive([1])
+        self.assertEqual(self.backend.page(1, offset=-1), ([message(1)], 2))
+        self.assertEqual(self.backend.get(1)["messages"], [message(0), message(1)])
+        self.assertEqual(self.backend.append(1, [message(2)]), 2)
+        removed = self.backend.remove_unused_archive_segments()
+        self.assertIsInstance(removed, list)
+        self.assertEqual(self.backend.remove_unused_archive_segments(), [])
+
+    def test_concurrent_appends(self):
+        self.create()
+        threads, per_thread = 8, 25
+        positions = []
+        lock = threading.Lock()
+
+        def worker(n):
+            for i in range(per_thread):
+                start = self.backend.append(1, [message(n * per_thread + i)])
+                with lock:
+                    positions.append(start)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        self.assertEqual(sorted(positions), list(range(threads * per_thread)))
+        stored = self.backend.get(1)["messages"]
+        self.assertEqual(sorted(m["content"] for m in stored), sorted(f"message {i}" for i in range(threads * per_thread)))
+
+
+class BackendBenchmarkMixin:
+    # Throughput of the common operations, reported on stderr. Numbers are
+    # only comparable between backends run on the same machine.
+
+    def timed(self, operation, count):
+        start = time.perf_counter()
+        for i in range(count):
+            operation(i)
+        return count / max(time.perf_counter() - start, 1e-9)
+
+    def test_throughput(self):
+        conversations, turns = 20 * BENCH_SCALE, 10 * BENCH_SCALE
+        for conversation_id in range(1, conversations + 1):
+            self.backend.create(conversation_id, conversation_id % 5, "Chat", "2025-01-01T12:00:00+00:00")
+
+        def append(i):
+            self.backend.append(i % conversations + 1, [message(2 * i), message(2 * i + 1, "assistant")])
+
+        results = {
+            "append": self.timed(append, conversations * turns),
+            "get": self.timed(lambda i: self.backend.get(i % conversations + 1), conversations * 5),
+            "page": self.timed(lambda i: self.backend.page(i % conversations + 1, offset=-10, limit=10), conversations * 5),
+            "list": self.timed(lambda i: self.backend.list_conversations(i % 5), 50),
+        }
+        self.assertEqual(len(self.backend.get(1)["messages"]), turns * 2)
+        summary = ", ".join(f"{name} {rate:,.0f}/s" for name, rate in results.items())
+        sys.stderr.write(f"\n{type(self.backend).__name__} ({conversations}x{turns * 2} messages): {summary}\n")
+
+
+class InMemoryBackendTests(BackendConformanceMixin, BackendBenchmarkMixin, SimpleTestCase):
+
+    def make_backend(self):
+        return InMemoryBackend()
+
+
+class TinyDBBackendTests(BackendConformanceMixin, BackendBenchmarkMixin, SimpleTestCase):
+
+    def make_backend(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = f"{tmp.name}/archive"
+        self.table = TinyDB(storage=MemoryStorage).table("conversations")
+        patcher = mock.patch.object(tinydb_store, "conversations_table", self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings = override_settings(ARCHIVE_DIR=self.archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return TinyDBBackend()
+
+    def test_archive_rehydrate_append(self):
+        self.create(1)
+        self.create(2)
+        self.create(3)
+        self.backend.append(1, [message(0), message(1, "assistant")])
+        self.backend.append(2, [message(2)])
+        self.assertEqual(self.backend.archive([1, 2, 3]), 2)
+
+        # The hot store keeps stubs pointing into one segment.
+        docs = {doc["conversation_id"]: doc for doc in self.table.all()}
+        self.assertEqual(docs[1]["messages"], [])
+        self.assertEqual(docs[1]["archived"]["count"], 2)
+        self.assertEqual(docs[2]["archived"]["count"], 1)
+        self.assertEqual(docs[1]["archived"]["segment"], docs[2]["archived"]["segment"])
+        self.assertNotIn("archived", docs[3])
+        self.assertEqual(os.listdir(self.archive_dir), [docs[1]["archived"]["segment"]])
+
+        self.assertEqual(self.backend.get(1)["messages"], [message(0), message(1, "assistant")])
+        self.assertEqual(self.backend.append(1, [message(3)]), 2)
+        docs = {doc["conversation_id"]: doc for doc in self.table.all()}
+        self.assertNotIn("archived", docs[1])
+        self.assertEqual(len(docs[1]["messages"]), 3)
+        # Conversation 2 still refers to the segment.
+        self.assertEqual(self.backend.remove_unused_archive_segments(), [])
+
+        self.assertEqual(self.backend.get(2)["messages"], [message(2)])
+        self.assertEqual(self.backend.remove_unused_archive_segments(), [docs[2]["archived"]["segment"]])
+        self.assertEqual(self.backend.get(2)["messages"], [message(2)])
+
+    def test_cleanup_waits_for_a_concurrent_archive(self):
+        self.create(1)
+        self.backend.append(1, [message(0)])
+        remove = archive.remove_unreferenced_segments
+        thread = threading.Thread(target=self.backend.archive, args=([1],))
+
+        def archive_meanwhile(referenced):
+            # archive() must not write a segment while the cleanup is
+            # deciding which ones are unreferenced.
+            thread.start()
+            thread.join(timeout=0.2)
+            self.assertTrue(thread.is_alive())
+            return remove(referenced)
+
+        with mock.patch.object(archive, "remove_unreferenced_segments", archive_meanwhile):
+            self.assertEqual(self.backend.remove_unused_archive_segments(), [])
+        thread.join()
+        self.assertIn("archived", self.table.all()[0])
+        self.assertEqual(len(os.listdir(self.archive_dir)), 1)
+        self.assertEqual(self.backend.get(1)["messages"], [message(0)])
+
+
+class GetBackendTests(SimpleTestCase):
+
+    def test_selected_from_settings(self):
+        with override_settings(MESSAGE_STORE_BACKEND="memory"):
+            self.assertIsInstance(get_backend(), InMemoryBackend)
+            self.assertIs(get_backend(), get_backend())
+        with override_settings(MESSAGE_STORE_BACKEND="tinydb"):
+            self.assertIsInstance(get_backend(), TinyDBBackend)
+        with override_settings(MESSAGE_STORE_BACKEND="messaging.store_backends.InMemoryBackend"):
+            self.assertIsInstance(get_backend(), InMemoryBackend)
@@ -0,0 +1,141 @@
+import threading
+import time
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from messaging import batch
+from messaging.circuit_breaker import CircuitOpenError
+from messaging.mistral_functions import UpstreamError
+from messaging.tests.utils import QueryBudgetTestCase
+from messaging.tinydb_store import MessageStore
+
+
+def fake_add_message(conversation_id, text):
+    # Conversation 2 is down, 3 has an open circuit, 4 is missing from the store.
+    if conversation_id == 2:
+        raise UpstreamError("Error 500: boom", 500)
+    if conversation_id == 3:
+        raise CircuitOpenError("chat", 30)
+    if conversation_id == 4:
+        return None
+    return f"Reply to: {text}"
+
+
+class RunBatchTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(MessageStore, "add_message", side_effect=fake_add_message)
+        self.add_message = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_per_item_in_input_order(self):
+        items = [
+            {"conversation_id": 1, "text": "a"},
+            {"conversation_id": 2, "text": "b"},
+            {"conversation_id": 3, "text": "c"},
+            {"conversation_id": 1, "text": "d"},
+            {"conversation_id": 4, "text": "e"},
+        ]
+        results = batch.run_batch(items)
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r["status"] for r in results], [201, 502, 503, 201, 404])
+        self.assertEqual(results[0]["content"], "Reply to: a")
+        self.assertEqual(results[3]["content"], "Reply to: d")
+        self.assertEqual(results[1]["error"], "Error 500: boom")
+        self.assertEqual(results[2]["retry_after"], 30)
+
+    def test_unexpected_errors_fail_only_their_item(self):
+        self.add_message.side_effect = lambda conversation_id, text: {1: "ok"}.get(conversation_id) or 1 / 0
+        results = batch.run_batch([{"conversation_id": 1, "text": "a"}, {"conversation_id": 5, "text": "b"}])
+        self.assertEqual([r["status"] for r in results], [201, 500])
+        self.assertIn("division by zero", results[1]["error"])
+
+    def test_empty_batch(self):
+        self.assertEqual(batch.run_batch([]), [])
+
+    def test_turns_of_a_conversation_run_in_order(self):
+        sent = []
+
+        def add_message(conversation_id, text):
+            # The first turn is the slowest; the second must still wait for it.
+            time.sleep(0.05 if text == "first" else 0)
+            sent.append(text)
+            return text
+
+        self.add_message.side_effect = add_message
+        batch.run_batch([{"conversation_id": 1, "text": "first"}, {"conversation_id": 1, "text": "second"}])
+        self.assertEqual(sent, ["first", "second"])
+
+    def test_workers_are_capped(self):
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def add_message(conversation_id, text):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return text
+
+        self.add_message.side_effect = add_message
+        items = [{"conversation_id": i, "text": "hi"} for i in range(6)]
+        with override_settings(BATCH_MAX_WORKERS=2):
+            results = batch.run_batch(items)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(batch.run_batch(items, max_workers=3)[0]["status"], 201)
+        self.assertEqual(peak[0], 3)
+        self.assertEqual([r["status"] for r in results], [201] * 6)
+
+
+class SendBatchViewTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+        patcher = mock.patch.object(MessageStore, "add_message", side_effect=fake_add_message)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, items):
+        return self.client.post("/messaging/batch/", {"items": items}, format="json")
+
+    def test_mixed_results(self):
+        other = self.create_user(email="other@example.com")
+        ok, foreign = self.seed(self.user, 1, 1)[0], self.seed(other, 1, 1)[0]
+        down = self.seed(self.user, 1, 1)[0]
+        with mock.patch.object(MessageStore, "add_message",
+                               side_effect=lambda c, text: fake_add_message(2 if c == down else 1, text)):
+            response = self.post([
+                {"conversation_id": ok, "text": "hello"},
+                {"conversation_id": foreign, "text": "hello"},
+                {"conversation_id": down, "text": "hello"},
+            ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data, {"results": [
+            {"index": 0, "conversation_id": ok, "status": 201, "content": "Reply to: hello"},
+            {"index": 1, "conversation_id": foreign, "status": 404, "error": "Conversation not found for the user"},
+            {"index": 2, "conversation_id": down, "status": 502, "error": "Error 500: boom"},
+        ]})
+
+    def test_malformed_items(self):
+        for items in (None, "x", [], {"conversation_id": 1, "text": "a"}):
+            with self.subTest(items=items):
+                response = self.post(items)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "items must be a non-empty list")
+        for item in ("x", [1, "a"], {"text": "a"}, {"conversation_id": "1", "text": "a"},
+                     {"conversation_id": True, "text": "a"}, {"conversation_id": 1}, {"conversation_id": 1, "text": ""},
+                     {"conversation_id": 1, "text": 5}):
+            with self.subTest(item=item):
+                response = self.post([item])
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "Each item needs an integer conversation_id and a text")
+
+    def test_item_limit(self):
+        with override_settings(BATCH_MAX_ITEMS=2):
+            response = self.post([{"conversation_id": 1, "text": "a"}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "At most 2 items per batch")
@@ -0,0 +1,91 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from messaging.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        patcher = mock.patch("messaging.circuit_breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("test", failure_threshold=3, latency_threshold=5.0,
+                                      reset_timeout=30.0, half_open_max_calls=1)
+
+    def fail(self, times=1):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure(RuntimeError("boom"))
+
+    def trip(self):
+        self.fail(3)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_trips_after_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.snapshot()["opened"], 1)
+
+    def test_success_resets_the_failure_count(self):
+        self.fail(2)
+        self.breaker.before_call()
+        self.breaker.record_success(0.1)
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_success(6.0)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.snapshot()["slow_calls"], 3)
+
+    def test_open_rejects_until_reset_timeout(self):
+        self.trip()
+        self.now += 10
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 20.0)
+        self.now += 20
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_half_open_success_closes(self):
+        self.trip()
+        self.now += 30
+        self.breaker.before_call()
+        # Only one trial call at a time.
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.before_call()
+
+    def test_half_open_failure_reopens(self):
+        self.trip()
+        self.now += 30
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.snapshot()["opened"], 2)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_release_frees_the_trial_slot(self):
+        self.trip()
+        self.now += 30
+        self.breaker.before_call()
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.before_call()
+
+    def test_call(self):
+        self.assertEqual(self.breaker.call(lambda x: x * 2, 21), 42)
+        for _ in range(3):
+            with self.assertRaises(ZeroDivisionError):
+                self.breaker.call(lambda: 1 / 0)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(lambda: None)
+        self.assertEqual(self.breaker.snapshot()["rejected"], 1)
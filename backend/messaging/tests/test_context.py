@@ -0,0 +1,129 @@
+import tempfile
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from messaging import context, vector_index
+from messaging.embeddings import HashingEmbedder
+from messaging.mistral_functions import UpstreamError
+
+
+def message(content, role="user"):
+    return {"role": role, "content": content, "timestamp": "2025-01-01T12:00:00"}
+
+
+HISTORY = [
+    message("What is a good pizza dough recipe?"),
+    message("Flour, water, salt and yeast; let the pizza dough rest overnight.", "assistant"),
+    message("How do I change a bike tyre?"),
+    message("Remove the wheel, lever the tyre off and replace the tube.", "assistant"),
+    message("Which train goes to the airport?"),
+    message("Take the express line from the central station.", "assistant"),
+    message("Thanks!"),
+    message("You're welcome.", "assistant"),
+]
+
+
+def prompt(messages):
+    return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+
+class VectorIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(EMBEDDER="hashing", VECTOR_DIR=f"{tmp.name}/vectors")
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_top_k(self):
+        matrix = np.array([[1, 0], [0.6, 0.8], [0, 1], [-1, 0], [0.8, 0.6]], dtype=np.float32)
+        query = np.array([1, 0], dtype=np.float32)
+        self.assertEqual(vector_index.top_k(matrix, query, 2), [0, 4])
+        self.assertEqual(vector_index.top_k(matrix, query, 3), [0, 1, 4])
+        # Rows with no similarity are never picked.
+        self.assertEqual(vector_index.top_k(matrix, query, 10), [0, 1, 4])
+        self.assertEqual(vector_index.top_k(matrix, query, 0), [])
+        self.assertEqual(vector_index.top_k(matrix[:0], query, 3), [])
+
+    def test_ensure_embeds_only_missing_rows(self):
+        embedder = HashingEmbedder()
+        with mock.patch("messaging.vector_index.get_embedder", return_value=embedder), \
+                mock.patch.object(embedder, "embed", wraps=embedder.embed) as embed:
+            matrix = vector_index.ensure(1, HISTORY[:4], embedder.dim)
+            self.assertEqual(matrix.shape, (4, embedder.dim))
+            self.assertEqual(len(embed.call_args.args[0]), 4)
+
+            matrix = vector_index.ensure(1, HISTORY, embedder.dim)
+            self.assertEqual(matrix.shape, (8, embedder.dim))
+            self.assertEqual(embed.call_args.args[0], [m["content"] for m in HISTORY[4:]])
+            np.testing.assert_allclose(matrix[:4], embedder.embed([m["content"] for m in HISTORY[:4]]), atol=1e-6)
+
+            embed.reset_mock()
+            np.testing.assert_array_equal(vector_index.ensure(1, HISTORY, embedder.dim), matrix)
+            embed.assert_not_called()
+
+    def test_ensure_rebuilds_for_another_embedder(self):
+        vector_index.append(1, 0, np.ones((2, 4), dtype=np.float32))
+        matrix = vector_index.ensure(1, HISTORY[:2], 256)
+        self.assertEqual(matrix.shape, (2, 256))
+        self.assertEqual(vector_index.load(1).shape, (2, 256))
+
+    def test_messages_without_text_get_zero_rows(self):
+        vectors = vector_index.embed_messages([message("hello"), message(""), message("world")])
+        self.assertEqual(np.linalg.norm(vectors, axis=1).round(3).tolist(), [1.0, 0.0, 1.0])
+        self.assertIsNone(vector_index.embed_messages([message("  ")]))
+
+    def test_append_keeps_positions_aligned(self):
+        self.assertTrue(vector_index.append(1, 0, np.ones((2, 4), dtype=np.float32)))
+        self.assertFalse(vector_index.append(1, 3, np.ones((1, 4), dtype=np.float32)))
+        self.assertFalse(vector_index.append(1, 2, np.ones((1, 8), dtype=np.float32)))
+        self.assertTrue(vector_index.append(1, 2, np.ones((1, 4), dtype=np.float32)))
+        self.assertEqual(vector_index.load(1).shape, (3, 4))
+
+
+@override_settings(CONTEXT_MODE="retrieval", CONTEXT_RECENT_MESSAGES=2, CONTEXT_TOP_K=2, EMBEDDER="hashing")
+class ContextSelectionTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(VECTOR_DIR=f"{tmp.name}/vectors")
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_full_mode_sends_everything(self):
+        messages = HISTORY + [message("Any tips for pizza dough?")]
+        with override_settings(CONTEXT_MODE="full"):
+            self.assertEqual(context.select(1, messages), (prompt(messages), None))
+
+    def test_short_conversations_are_sent_whole(self):
+        messages = HISTORY[:3] + [message("Any tips for pizza dough?")]
+        self.assertEqual(context.select(1, messages), (prompt(messages), None))
+
+    def test_picks_similar_older_messages_and_the_recent_ones(self):
+        messages = HISTORY + [message("Can I freeze pizza dough?")]
+        selected, query = context.select(1, messages)
+        self.assertEqual(selected, prompt(HISTORY[:2] + messages[-2:]))
+        self.assertEqual(query.shape, (256,))
+        # The stored history was embedded on the way.
+        self.assertEqual(vector_index.load(1).shape, (len(HISTORY), 256))
+
+    def test_record_then_select(self):
+        context.record(1, 0, HISTORY)
+        self.assertEqual(vector_index.load(1).shape, (len(HISTORY), 256))
+        messages = HISTORY + [message("Is the airport train fast?")]
+        with mock.patch("messaging.vector_index.embed_messages", wraps=vector_index.embed_messages) as embed, \
+                override_settings(CONTEXT_TOP_K=1):
+            selected, _ = context.select(1, messages)
+        # Only the new message is embedded.
+        self.assertEqual(embed.call_count, 1)
+        self.assertEqual(selected, prompt(HISTORY[4:5] + messages[-2:]))
+
+    def test_falls_back_to_the_full_history_when_embedding_fails(self):
+        messages = HISTORY + [message("Can I freeze pizza dough?")]
+        with mock.patch.object(HashingEmbedder, "embed", side_effect=UpstreamError("down", 503)), \
+                self.assertLogs("messaging.context", "ERROR"):
+            self.assertEqual(context.select(1, messages), (prompt(messages), None))
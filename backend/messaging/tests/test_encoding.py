@@ -0,0 +1,61 @@
+from django.test import SimpleTestCase, override_settings
+from messaging import encoding
+
+MESSAGES = [
+    {"role": "user", "content": "Hello", "timestamp": "2025-01-01T12:00:00"},
+    {"role": "assistant", "content": "Hi!", "timestamp": "2025-01-01T12:00:01.123456"},
+    {"role": "system", "content": "", "timestamp": "1969-12-31T23:59:59"},
+    {"role": "tool", "content": "no timestamp"},
+    {"role": "moderator", "content": "custom role", "timestamp": "2025-01-01T12:00:02"},
+    {"role": "assistant", "content": "partial", "timestamp": "2025-01-01T12:00:03", "status": "cancelled"},
+]
+
+
+@override_settings(MESSAGE_COMPRESS_THRESHOLD=100)
+class EncodingTests(SimpleTestCase):
+
+    def round_trip(self, messages):
+        stored = encoding.encode_messages(messages)
+        return stored, encoding.decode_messages(stored, encoding.ENCODING_VERSION)
+
+    def test_round_trip(self):
+        stored, decoded = self.round_trip(MESSAGES)
+        self.assertEqual(decoded, MESSAGES)
+        self.assertEqual(stored[0], [0, 1735732800000000, "Hello"])
+        self.assertEqual(stored[4][0], "moderator")
+        self.assertEqual(stored[5][3], {"status": "cancelled"})
+
+    def test_timestamps_that_would_change_are_kept_in_extra(self):
+        for timestamp in ("2025-01-01T12:00:00+02:00", "2025-01-01 12:00:00", "2025-01-01T12:00:00.500",
+                          "yesterday", 1735732800):
+            with self.subTest(timestamp=timestamp):
+                message = {"role": "user", "content": "x", "timestamp": timestamp}
+                stored, decoded = self.round_trip([message])
+                self.assertIsNone(stored[0][1])
+                self.assertEqual(stored[0][3], {"timestamp": timestamp})
+                self.assertEqual(decoded, [message])
+
+    def test_compression_threshold(self):
+        short = {"role": "user", "content": "a" * 99}
+        long = {"role": "assistant", "content": "answer " * 100}
+        random_text = {"role": "assistant", "content": "".join(chr(0x4e00 + (i * 7919) % 20000) for i in range(60))}
+        stored, decoded = self.round_trip([short, long, random_text])
+        self.assertEqual(stored[0][2], short["content"])
+        self.assertIsInstance(stored[1][2], dict)
+        self.assertLess(len(stored[1][2]["z"]), len(long["content"]))
+        # Compressing would not make it smaller.
+        self.assertEqual(stored[2][2], random_text["content"])
+        self.assertEqual(decoded, [short, long, random_text])
+
+    def test_version_1_is_read_as_is(self):
+        self.assertEqual(encoding.decode_messages(MESSAGES, 1), MESSAGES)
+
+    def test_upgrade(self):
+        upgraded = encoding.upgrade(MESSAGES, 1)
+        self.assertEqual(upgraded, encoding.encode_messages(MESSAGES))
+        self.assertIs(encoding.upgrade(upgraded, encoding.ENCODING_VERSION), upgraded)
+        self.assertEqual(encoding.decode_messages(upgraded, encoding.ENCODING_VERSION), MESSAGES)
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            encoding.decode_messages([], 99)
@@ -0,0 +1,145 @@
+import threading
+from contextlib import nullcontext
+from unittest import mock
+from django.test import override_settings
+from messaging import jobs
+from messaging.cancellation import GenerationCancelled
+from messaging.circuit_breaker import CircuitOpenError
+from messaging.mistral_functions import UpstreamError
+from messaging.models import Conversation, GenerationJob
+from messaging.tests.utils import QueryBudgetTestCase
+from messaging.tinydb_store import MessageStore
+
+
+class RunTests(QueryBudgetTestCase):
+    # jobs._run() called directly; submit() only schedules it after commit.
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.conversation_id = self.seed(self.user, 1, 1)[0]
+
+    def job(self, **fields):
+        job = GenerationJob.objects.create(user=self.user, conversation_id=self.conversation_id, text="hello", **fields)
+        jobs._events[job.id] = threading.Event()
+        return job
+
+    def run_job(self, job, add_message):
+        event = jobs._events[job.id]
+        with mock.patch.object(MessageStore, "add_message", side_effect=add_message) as patched:
+            jobs._run(job.id)
+        self.assertTrue(event.is_set())
+        self.assertNotIn(job.id, jobs._events)
+        job.refresh_from_db()
+        return job, patched
+
+    def test_succeeded(self):
+        job, _ = self.run_job(self.job(), lambda *args, **kwargs: "Hi there")
+        self.assertEqual(job.status, GenerationJob.SUCCEEDED)
+        self.assertEqual(job.result, "Hi there")
+        self.assertIsNotNone(job.started_at)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_runs_as_running(self):
+        statuses = []
+
+        def add_message(*args, **kwargs):
+            statuses.append(GenerationJob.objects.get(id=job.id).status)
+            return "Hi there"
+
+        job = self.job()
+        self.run_job(job, add_message)
+        self.assertEqual(statuses, [GenerationJob.RUNNING])
+
+    def test_failures(self):
+        cases = [
+            (lambda *args, **kwargs: None, 404, "Conversation not found"),
+            (CircuitOpenError("chat", 30), 503, "Upstream 'chat' is unavailable, retry in 30s"),
+            (UpstreamError("Error 500: boom", 500), 502, "Error 500: boom"),
+            (RuntimeError("bug"), 500, "bug"),
+        ]
+        for add_message, error_status, error in cases:
+            with self.subTest(error_status=error_status):
+                with self.assertLogs("messaging.jobs", "ERROR") if error_status == 500 else nullcontext():
+                    job, _ = self.run_job(self.job(), add_message)
+                self.assertEqual(job.status, GenerationJob.FAILED)
+                self.assertEqual(job.error_status, error_status)
+                self.assertEqual(job.error, error)
+                self.assertIsNotNone(job.finished_at)
+
+    def test_cancelled_midway_keeps_the_partial_reply(self):
+        job, _ = self.run_job(self.job(), GenerationCancelled("Hi th"))
+        self.assertEqual(job.status, GenerationJob.CANCELLED)
+        self.assertEqual(job.result, "Hi th")
+
+    def test_cancelled_while_queued_is_not_run(self):
+        job = self.job()
+        self.assertEqual(jobs.cancel(GenerationJob.objects.filter(id=job.id)), 1)
+        job, add_message = self.run_job(job, lambda *args, **kwargs: "Hi there")
+        add_message.assert_not_called()
+        self.assertEqual(job.status, GenerationJob.CANCELLED)
+        self.assertIsNone(job.started_at)
+
+    def test_cancel_token_sees_cancel_requests_from_other_processes(self):
+        def add_message(*args, cancel_token, **kwargs):
+            self.assertFalse(cancel_token.cancelled)
+            # As written by another process serving POST /messaging/cancel/.
+            GenerationJob.objects.filter(id=job.id).update(cancel_requested=True)
+            cancel_token._last_check -= 1  # due for its next database check
+            self.assertTrue(cancel_token.cancelled)
+            raise GenerationCancelled("")
+
+        job = self.job()
+        job, _ = self.run_job(job, add_message)
+        self.assertEqual(job.status, GenerationJob.CANCELLED)
+
+    def test_title(self):
+        with override_settings(COMBINED_TITLE_REPLY=False), \
+                mock.patch.object(jobs, "get_title", return_value="Greetings"):
+            self.run_job(self.job(generate_title=True), lambda *args, **kwargs: "Hi there")
+        self.assertEqual(Conversation.objects.get(id=self.conversation_id).title, "Greetings")
+
+        with override_settings(COMBINED_TITLE_REPLY=True):
+            _, add_message = self.run_job(self.job(generate_title=True), lambda *args, **kwargs: "Hi there")
+        self.assertTrue(add_message.call_args.kwargs["with_title"])
+
+
+class WaitTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+        conversation_id = self.seed(self.user, 1, 1)[0]
+        self.job = GenerationJob.objects.create(user=self.user, conversation_id=conversation_id, text="hello")
+
+    def test_returns_once_finished(self):
+        event = jobs._events[self.job.id] = threading.Event()
+        self.addCleanup(jobs._events.pop, self.job.id, None)
+        GenerationJob.objects.filter(id=self.job.id).update(status=GenerationJob.SUCCEEDED, result="Hi")
+        event.set()
+        job = jobs.wait(self.job, 30)
+        self.assertEqual(job.status, GenerationJob.SUCCEEDED)
+
+    def test_times_out(self):
+        with mock.patch.object(jobs, "POLL_INTERVAL", 0.01):
+            self.assertEqual(jobs.wait(self.job, 0.05).status, GenerationJob.QUEUED)
+
+    def test_rejects_non_finite_timeouts(self):
+        for timeout in (float("nan"), float("inf")):
+            with self.subTest(timeout=timeout), self.assertRaises(ValueError):
+                jobs.wait(self.job, timeout)
+
+    def test_bad_wait_parameter(self):
+        for wait in ("nan", "NaN", "inf", "-inf", "infinity", "abc", ""):
+            with self.subTest(wait=wait):
+                response = self.client.get(f"/messaging/jobs/{self.job.id}/", {"wait": wait})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "wait must be a number of seconds")
+
+    def test_wait_is_clamped(self):
+        with mock.patch.object(jobs, "wait", wraps=jobs.wait) as wait, override_settings(JOB_MAX_WAIT=0.01):
+            for value, expected in (("-5", 0), ("1e9", 0.01), ("0.005", 0.005)):
+                response = self.client.get(f"/messaging/jobs/{self.job.id}/", {"wait": value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(wait.call_args.args[1], expected)
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from datetime import datetime
+from django.test import SimpleTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from tinydb import TinyDB
+from messaging import jsoncodec
+from messaging.renderers import FastJSONRenderer
+from messaging.tinydb_store import CodecJSONStorage
+
+DOCUMENT = {
+    "conversations": {"1": {"title": "Ünïcode ✓", "messages": [[1, 1735732800, "hi there"]], "v": 2}},
+    "empty": {},
+}
+
+
+class JSONCodecTests(SimpleTestCase):
+
+    def test_codecs_read_each_other(self):
+        names = jsoncodec.available_codecs()
+        for writer in names:
+            for reader in names:
+                data = jsoncodec.get_codec(writer).dumps(DOCUMENT)
+                self.assertIsInstance(data, bytes)
+                self.assertEqual(jsoncodec.get_codec(reader).loads(data), DOCUMENT)
+
+    def test_default_handles_other_types(self):
+        moment = datetime(2025, 1, 1, 12, 0)
+        for name in jsoncodec.available_codecs():
+            data = jsoncodec.get_codec(name).dumps({"at": moment}, default=lambda o: o.isoformat())
+            self.assertEqual(jsoncodec.loads(data), {"at": "2025-01-01T12:00:00"})
+
+    def test_renderer_matches_drf(self):
+        data = {"conversation_id": 1, "messages": [{"role": "user", "content": "Ünïcode \u2028\u2029"}], "at": datetime(2025, 1, 1)}
+        for name in jsoncodec.available_codecs():
+            with override_settings(JSON_CODEC=name):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_storage_reads_stdlib_files(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "appdata.json")
+        with TinyDB(path) as db:
+            db.table("conversations").insert({"conversation_id": 1, "title": "Ünïcode"})
+        with TinyDB(path, storage=CodecJSONStorage) as db:
+            table = db.table("conversations")
+            self.assertEqual(table.all(), [{"conversation_id": 1, "title": "Ünïcode"}])
+            table.insert({"conversation_id": 2, "title": "Second"})
+        with TinyDB(path) as db:
+            self.assertEqual(len(db.table("conversations")), 2)
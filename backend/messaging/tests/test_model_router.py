@@ -0,0 +1,159 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from messaging import jsoncodec, mistral_functions
+from messaging.circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker, CircuitOpenError
+from messaging.mistral_functions import UpstreamError, _complete, _post
+from messaging.model_router import FAILURE_COOLDOWN, ModelRouter
+
+COMPLETION = b'{"choices": [{"message": {"role": "assistant", "content": "Hi"}}], "usage": {"total_tokens": 3}}'
+
+ROUTES = {
+    "chat": [
+        {"model": "a", "timeout": 10},
+        {"model": "b", "timeout": 10},
+        {"model": "c", "timeout": 10},
+    ],
+    "empty": [],
+}
+
+
+def models(entries):
+    return [entry["model"] for entry in entries]
+
+
+class ModelRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        patcher = mock.patch("messaging.model_router.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ModelRouter(ROUTES)
+
+    def test_configured_order_when_healthy(self):
+        self.router.record("a", 1.0, ok=True)
+        self.assertEqual(models(self.router.candidates("chat")), ["a", "b", "c"])
+
+    def test_unknown_or_empty_route(self):
+        for task in ("missing", "empty"):
+            with self.assertRaises(KeyError):
+                self.router.candidates(task)
+
+    def test_failed_model_is_demoted_for_the_cooldown(self):
+        self.router.record("a", 1.0, ok=False)
+        self.assertEqual(models(self.router.candidates("chat")), ["b", "c", "a"])
+        self.now += FAILURE_COOLDOWN
+        self.assertEqual(models(self.router.candidates("chat")), ["a", "b", "c"])
+
+    def test_success_restores_a_failed_model(self):
+        self.router.record("a", 1.0, ok=False)
+        self.router.record("a", 1.0, ok=True)
+        self.assertEqual(models(self.router.candidates("chat")), ["a", "b", "c"])
+
+    def test_slow_model_is_demoted(self):
+        self.router.record("a", 9.0, ok=True)
+        self.assertEqual(models(self.router.candidates("chat")), ["b", "c", "a"])
+
+    def test_degraded_models_fewest_failures_then_fastest_first(self):
+        self.router.record("a", 1.0, ok=False)
+        self.router.record("a", 1.0, ok=False)
+        self.router.record("b", 9.5, ok=False)
+        self.router.record("c", 9.0, ok=False)
+        self.assertEqual(models(self.router.candidates("chat")), ["c", "b", "a"])
+
+
+class FailoverTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(mistral_functions, "router", ModelRouter(ROUTES))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def complete(self, outcomes, **kwargs):
+        # outcomes: model -> response data or exception raised by _post.
+        calls = []
+
+        def post(payload, timeout=None, cancel_token=None):
+            calls.append(payload["model"])
+            outcome = outcomes[payload["model"]]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(mistral_functions, "_post", post):
+            return _complete("chat", {"messages": []}, **kwargs), calls
+
+    def test_fails_over_on_outages(self):
+        data, calls = self.complete({
+            "a": UpstreamError("rate limited", 429),
+            "b": CircuitOpenError("b", 10),
+            "c": {"ok": True},
+        })
+        self.assertEqual(data, {"ok": True})
+        self.assertEqual(calls, ["a", "b", "c"])
+
+    def test_client_errors_are_not_retried(self):
+        with self.assertRaises(UpstreamError) as raised:
+            self.complete({"a": UpstreamError("bad request", 400), "b": {"ok": True}, "c": {"ok": True}})
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_soonest_retry_when_every_circuit_is_open(self):
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.complete({"a": CircuitOpenError("a", 20), "b": CircuitOpenError("b", 5), "c": CircuitOpenError("c", 9)})
+        self.assertEqual(raised.exception.name, "b")
+
+    def test_explicit_model_bypasses_routing(self):
+        _, calls = self.complete({"x": {"ok": True}}, model="x")
+        self.assertEqual(calls, ["x"])
+
+    def test_no_models_configured(self):
+        with mock.patch.object(mistral_functions, "router", ModelRouter({"chat": []})):
+            with self.assertRaisesMessage(KeyError, "No model route configured for task 'chat'"):
+                self.complete({})
+
+
+class PostTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        for patcher in (
+            mock.patch.object(mistral_functions, "router", ModelRouter(ROUTES)),
+            mock.patch.object(mistral_functions, "get_model_breaker", lambda model: self.breaker),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, status_code, content):
+        response = mock.Mock(status_code=status_code, content=content, text=content.decode())
+        with mock.patch.object(mistral_functions.requests, "post", return_value=response):
+            return _post({"model": "a", "messages": []})
+
+    def test_json_response(self):
+        self.assertEqual(self.post(200, COMPLETION), jsoncodec.loads(COMPLETION))
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_malformed_completion_is_an_upstream_failure(self):
+        for body in (b'{}', b'{"choices": []}', b'{"choices": [{"message": {}}]}',
+                     b'{"choices": [{"message": {"content": null}}]}', b'[]', b'"text"'):
+            with self.subTest(body=body):
+                failures = self.breaker.snapshot()["failures"]
+                with self.assertRaises(UpstreamError) as raised:
+                    self.post(200, body)
+                self.assertTrue(raised.exception.is_outage)
+                self.assertEqual(self.breaker.snapshot()["failures"], failures + 1)
+                self.assertEqual(mistral_functions.router.snapshot()["a"]["successes"], 0)
+
+    def test_invalid_body_is_an_upstream_failure(self):
+        # The breaker re-opens at once (reset_timeout=0 makes it half-open again).
+        self.breaker.record_failure("earlier outage")
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        with self.assertRaises(UpstreamError) as raised:
+            self.post(200, b"<html>Bad gateway</html>")
+        self.assertTrue(raised.exception.is_outage)
+        self.assertEqual(self.breaker.snapshot()["opened"], 2)
+        # The trial slot is free again for the next call.
+        self.post(200, COMPLETION)
+        self.assertEqual(self.breaker.state, CLOSED)
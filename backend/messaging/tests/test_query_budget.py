@@ -0,0 +1,229 @@
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from messaging import batch
+from messaging.export import iter_export
+from messaging.models import Conversation, GenerationJob
+from messaging.tests.utils import SIZES, QueryBudgetTestCase
+from profiling.models import ProfileCapture
+
+
+class InlineExecutor:
+    # Runs the batch workers in the test's thread, where their queries are
+    # counted; worker threads would use their own database connections.
+
+    def __init__(self, max_workers=None, thread_name_prefix=""):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, func, *iterables):
+        return map(func, *iterables)
+
+
+class MessagingQueryBudgetTests(QueryBudgetTestCase):
+    # Budgets must not grow with the number of conversations or messages.
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def test_get_conversations(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                self.seed(self.user, conversations, turns)
+                # user lookup, conversation list
+                with self.assertBudget(queries=2, store_ops=0):
+                    response = self.client.get("/messaging/conversations/")
+                self.assertEqual(response.status_code, 200)
+                latest = response.data["conversations"][0]
+                self.assertEqual(latest["message_count"], turns * 2)
+                self.assertEqual(latest["last_message_preview"], f"answer {turns - 1}")
+
+    def test_get_messages(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                conversation_id = self.seed(self.user, conversations, turns)[-1]
+                # user lookup, ownership check
+                with self.assertBudget(queries=2, store_ops=1):
+                    response = self.client.get("/messaging/messages/", {"conversation_id": conversation_id})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data["messages"]), turns * 2)
+
+    def test_bootstrap(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                ids = self.seed(self.user, conversations, turns)
+                # user lookup, page of conversations; the latest messages in one store read
+                with self.assertBudget(queries=2, store_ops=1):
+                    response = self.client.get("/messaging/bootstrap/", {"messages": 10})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data["user"]["email"], self.user.email)
+                self.assertEqual(response.data["conversation_id"], ids[-1])
+                self.assertEqual(len(response.data["messages"]), min(turns * 2, 10))
+                self.assertEqual(response.data["messages"][-1]["content"], f"answer {turns - 1}")
+                # plus the ownership check of a conversation outside the first page
+                with self.assertBudget(queries=3, store_ops=1):
+                    response = self.client.get("/messaging/bootstrap/", {"conversation_id": ids[0], "page_size": 1})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data["conversation_id"], ids[0])
+
+    def test_send_to_existing_conversation(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                conversation_id = self.seed(self.user, conversations, turns)[-1]
+                # user lookup, ownership check, updated_at
+                with self.assertBudget(queries=3, store_ops=3):
+                    response = self.client.post(
+                        "/messaging/send/", {"conversation_id": conversation_id, "text": "hello"}, format="json"
+                    )
+                self.assertEqual(response.status_code, 201)
+
+    def test_send_new_conversation(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                self.seed(self.user, conversations, turns)
+                # user lookup, conversation insert, updated_at
+                with self.assertBudget(queries=3, store_ops=4):
+                    response = self.client.post("/messaging/send/", {"text": "hello"}, format="json")
+                self.assertEqual(response.status_code, 201)
+
+    def test_send_async_and_poll_job(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                conversation_id = self.seed(self.user, conversations, turns)[-1]
+                # user lookup, ownership check, job insert; the worker runs after commit
+                with self.assertBudget(queries=3, store_ops=0):
+                    response = self.client.post(
+                        "/messaging/send/", {"conversation_id": conversation_id, "text": "hello", "async": True},
+                        format="json",
+                    )
+                self.assertEqual(response.status_code, 202)
+                # user lookup, job
+                with self.assertBudget(queries=2, store_ops=0):
+                    response = self.client.get(f"/messaging/jobs/{response.data['job_id']}/")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data["status"], "queued")
+
+    def test_cancel(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                conversation_id = self.seed(self.user, conversations, turns)[-1]
+                # user lookup, ownership check, unfinished jobs of the conversation
+                with self.assertBudget(queries=3, store_ops=0):
+                    response = self.client.post("/messaging/cancel/", {"conversation_id": conversation_id}, format="json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_search(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                self.seed(self.user, conversations, turns)
+                # user lookup, titles of the conversations on the page
+                with self.assertBudget(queries=2, store_ops=0):
+                    response = self.client.get("/messaging/search/", {"q": "question"})
+                self.assertEqual(response.status_code, 200)
+
+    def test_export(self):
+        # user lookup, conversation list; one read of the message store
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                self.seed(self.user, conversations, turns)
+                total = Conversation.objects.filter(user=self.user).count()
+                with self.assertBudget(queries=2, store_ops=1):
+                    response = self.client.get("/messaging/export/")
+                    body = b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body.count(b'"type":"conversation"'), total)
+                messages = sum(Conversation.objects.filter(user=self.user).values_list("message_count", flat=True))
+                self.assertEqual(body.count(b'"type":"message"'), messages)
+
+    def test_import(self):
+        # Per imported conversation: an insert and a stats update query, and three
+        # store operations (insert, then read and update when its messages are appended).
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                other = self.create_user(email=f"source-{conversations}@example.com")
+                self.seed(other, conversations, turns)
+                export = "".join(iter_export(other.id)).encode("utf-8")
+                upload = SimpleUploadedFile("export.ndjson", export, content_type="application/x-ndjson")
+                with self.assertBudget(queries=1 + 2 * conversations, store_ops=3 * conversations):
+                    response = self.client.post("/messaging/import/", {"file": upload}, format="multipart")
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data["messages"], conversations * turns * 2)
+
+    def test_batch(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations, turns=turns):
+                ids = self.seed(self.user, conversations, turns)
+                items = [{"conversation_id": conversation_id, "text": "hello"} for conversation_id in ids[-3:]]
+                # user lookup, ownership of every item, then per item the
+                # updated_at query and the store operations of a send
+                with mock.patch.object(batch, "ThreadPoolExecutor", InlineExecutor), \
+                        self.assertBudget(queries=2 + len(items), store_ops=3 * len(items)):
+                    response = self.client.post("/messaging/batch/", {"items": items}, format="json")
+                self.assertEqual(response.status_code, 207)
+                self.assertEqual([r["status"] for r in response.data["results"]], [201] * len(items))
+
+    def test_upstream_status(self):
+        staff = self.create_user(email="staff@example.com", is_staff=True)
+        with self.assertBudget(queries=1, store_ops=0):
+            response = self.client_for(staff).get("/messaging/upstream/status/")
+        self.assertEqual(response.status_code, 200)
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.create_user(email="admin@example.com", is_staff=True, is_superuser=True)
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_conversation_changelist(self):
+        for conversations, turns in SIZES:
+            with self.subTest(conversations=conversations):
+                for i in range(3):
+                    user = self.create_user(email=f"owner-{conversations}-{i}@example.com")
+                    self.seed(user, conversations, 1)
+                # session, user, counts, page of conversations with their users
+                with self.assertBudget(queries=6):
+                    response = self.client.get("/admin/messaging/conversation/")
+                self.assertEqual(response.status_code, 200)
+                with self.assertBudget(queries=6):
+                    response = self.client.get("/admin/messaging/conversation/", {"q": "example.com"})
+                self.assertEqual(response.status_code, 200)
+
+    def test_generation_job_changelist(self):
+        for conversations, _ in SIZES:
+            with self.subTest(conversations=conversations):
+                for i in range(3):
+                    user = self.create_user(email=f"job-owner-{conversations}-{i}@example.com")
+                    for conversation_id in self.seed(user, conversations, 1):
+                        GenerationJob.objects.create(user=user, conversation_id=conversation_id, text="hello")
+                # session, user, counts, page of jobs with their conversations and users
+                with self.assertBudget(queries=6):
+                    response = self.client.get("/admin/messaging/generationjob/")
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile_capture_changelist(self):
+        created = 0
+        for conversations, _ in SIZES:
+            with self.subTest(captures=conversations):
+                for i in range(conversations):
+                    user = self.create_user(email=f"profiled-{created}@example.com")
+                    ProfileCapture.objects.create(
+                        user=user, method="GET", path="/messaging/conversations/", status_code=200,
+                        trigger=ProfileCapture.SAMPLE, wall_time=0.01, cpu_time=0.01,
+                        file_name=f"capture-{created}.prof", size=100,
+                    )
+                    created += 1
+                # session, user, counts, page of captures with their users, and
+                # the choices of the method and status code filters
+                with self.assertBudget(queries=7):
+                    response = self.client.get("/admin/profiling/profilecapture/")
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,123 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from django.test import SimpleTestCase, override_settings
+from messaging import search_index
+
+# Messages indexed by the latency check; raise SEARCH_BENCH_SCALE to test
+# larger histories.
+BENCH_SCALE = int(os.getenv("SEARCH_BENCH_SCALE", "1"))
+# Search must stay interactive however long the history is.
+LATENCY_TARGET = 0.1
+
+
+def message(content, role="user"):
+    return {"role": role, "content": content, "timestamp": "2025-01-01T12:00:00"}
+
+
+class SearchIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(SEARCH_INDEX_PATH=f"{tmp.name}/search.sqlite3")
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def conversations(self, query, user_id=1, **kwargs):
+        hits, _ = search_index.search(user_id, query, **kwargs)
+        return [(hit["conversation_id"], hit["position"]) for hit in hits]
+
+    def test_index_and_search(self):
+        search_index.index_messages(1, 1, [message("How do I bake bread?"), message("Knead the dough.", "assistant")])
+        hits, has_more = search_index.search(1, "dough")
+        self.assertFalse(has_more)
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]["conversation_id"], 1)
+        self.assertEqual(hits[0]["position"], 1)
+        self.assertEqual(hits[0]["role"], "assistant")
+        self.assertIn("<mark>dough</mark>", hits[0]["snippet"])
+
+    def test_snippet_escapes_message_content(self):
+        search_index.index_messages(1, 1, [message('<script>alert("x")</script> & <b>bold</b> dough')])
+        hits, _ = search_index.search(1, "dough")
+        self.assertEqual(
+            hits[0]["snippet"],
+            '&lt;script&gt;alert("x")&lt;/script&gt; &amp; &lt;b&gt;bold&lt;/b&gt; <mark>dough</mark>',
+        )
+
+    def test_every_word_must_match(self):
+        search_index.index_messages(1, 1, [message("bake bread"), message("bake cake"), message("bread crumbs")])
+        self.assertEqual(self.conversations("bake bread"), [(1, 0)])
+
+    def test_results_are_limited_to_the_owner(self):
+        search_index.index_messages(1, 1, [message("secret recipe")])
+        search_index.index_messages(2, 2, [message("secret recipe")])
+        self.assertEqual(self.conversations("secret", user_id=1), [(1, 0)])
+        self.assertEqual(self.conversations("secret", user_id=2), [(2, 0)])
+        self.assertEqual(self.conversations("u2 secret", user_id=1), [])
+
+    def test_last_word_matches_as_prefix(self):
+        search_index.index_messages(1, 1, [message("sourdough starter")])
+        self.assertEqual(self.conversations("sourdough sta"), [(1, 0)])
+        self.assertEqual(self.conversations("sour starter"), [])
+
+    def test_operators_are_taken_literally(self):
+        search_index.index_messages(1, 1, [message("cats NOT dogs"), message("cats only")])
+        for query in ('cats NOT dogs', 'cats OR', '"cats', 'owner:u1 cats*', 'NEAR(cats dogs)', '(cats) AND -dogs'):
+            with self.subTest(query=query):
+                search_index.search(1, query)
+        self.assertEqual(self.conversations("cats NOT dogs"), [(1, 0)])
+        self.assertEqual(self.conversations("!!! ???"), [])
+
+    def test_diacritics_are_ignored(self):
+        search_index.index_messages(1, 1, [message("crème brûlée")])
+        self.assertEqual(self.conversations("creme brulee"), [(1, 0)])
+
+    def test_reindexing_replaces_and_removal_deletes(self):
+        search_index.index_messages(1, 1, [message("old text")])
+        search_index.index_messages(1, 1, [message("new text")])
+        self.assertEqual(self.conversations("old"), [])
+        self.assertEqual(self.conversations("new"), [(1, 0)])
+        search_index.remove_conversation(1)
+        self.assertEqual(self.conversations("text"), [])
+
+    def test_pagination(self):
+        search_index.index_messages(1, 1, [message(f"page item {i}") for i in range(5)])
+        first, has_more = search_index.search(1, "item", limit=2)
+        self.assertTrue(has_more)
+        second, _ = search_index.search(1, "item", limit=2, offset=2)
+        last, has_more = search_index.search(1, "item", limit=2, offset=4)
+        self.assertFalse(has_more)
+        positions = [hit["position"] for hit in first + second + last]
+        self.assertEqual(sorted(positions), list(range(5)))
+
+    def test_latency_at_scale(self):
+        # Median and worst search time over a history of many users; the
+        # numbers are reported on stderr.
+        rng = random.Random(0)
+        words = ("model answer context token request python django message store conversation "
+                 "latency index search archive vector response upstream title").split()
+        users, conversations, per_conversation = 20, 50 * BENCH_SCALE, 20
+        conversation_id = 0
+        for user_id in range(users):
+            for _ in range(conversations):
+                conversation_id += 1
+                search_index.index_messages(conversation_id, user_id, [
+                    message(" ".join(rng.choice(words) for _ in range(40))) for _ in range(per_conversation)
+                ])
+
+        timings = []
+        for n in range(50):
+            query = " ".join(rng.sample(words, 2))[:-2]
+            start = time.perf_counter()
+            search_index.search(n % users, query)
+            timings.append(time.perf_counter() - start)
+        total = users * conversations * per_conversation
+        sys.stderr.write(f"\nsearch over {total} messages: median {statistics.median(timings) * 1000:.1f} ms, "
+                         f"max {max(timings) * 1000:.1f} ms\n")
+        self.assertLess(statistics.median(timings), LATENCY_TARGET)
@@ -0,0 +1,70 @@
+import random
+from django.test import SimpleTestCase
+from messaging import synthetic
+from messaging.models import Conversation
+from messaging.store_backends import get_backend
+from messaging.tests.utils import QueryBudgetTestCase
+
+
+class ParseDistributionTests(SimpleTestCase):
+
+    def sample(self, spec, n=200, **kwargs):
+        words = synthetic.parse_distribution(spec, **kwargs)
+        rng = random.Random(0)
+        return [words(rng) for _ in range(n)]
+
+    def test_fixed(self):
+        self.assertEqual(set(self.sample("fixed:7")), {7})
+        self.assertEqual(set(self.sample("fixed:0")), {0})
+
+    def test_uniform(self):
+        counts = self.sample("uniform:5:8")
+        self.assertEqual(set(counts), {5, 6, 7, 8})
+        self.assertEqual(set(self.sample("uniform:3:3")), {3})
+
+    def test_lognormal(self):
+        counts = self.sample("lognormal:5.5:1.0", n=1000)
+        self.assertGreaterEqual(min(counts), 1)
+        self.assertLessEqual(max(counts), synthetic.MAX_WORDS)
+        self.assertLess(min(counts), 100)
+        self.assertGreater(max(counts), 1000)
+        self.assertEqual(max(self.sample("lognormal:20:1", max_words=50)), 50)
+
+    def test_invalid(self):
+        for spec in ("", "fixed", "fixed:", "fixed:abc", "fixed:1:2", "fixed:-1", "fixed:inf", "fixed:nan",
+                     "uniform:5", "uniform:8:5", "uniform:-1:5", "lognormal:5", "lognormal:5:-1",
+                     "lognormal:nan:1", "normal:5:1", "5"):
+            with self.subTest(spec=spec), self.assertRaisesMessage(ValueError, "Invalid length distribution"):
+                synthetic.parse_distribution(spec)
+
+
+class SyntheticDataTests(QueryBudgetTestCase):
+
+    def test_conversations_are_reproducible(self):
+        first = synthetic.synthetic_conversations(3, 4, seed=7)
+        self.assertEqual(first, synthetic.synthetic_conversations(3, 4, seed=7))
+        self.assertNotEqual(first, synthetic.synthetic_conversations(3, 4, seed=8))
+        self.assertEqual([len(messages) for messages in first], [8, 8, 8])
+        self.assertEqual([m["role"] for m in first[0][:2]], ["user", "assistant"])
+        timestamps = [m["timestamp"] for m in first[0]]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_word_counts(self):
+        messages = synthetic.synthetic_conversations(1, 3, seed=1, user_words="fixed:2", reply_words="fixed:5")[0]
+        self.assertEqual([len(m["content"].split()) for m in messages], [2, 5] * 3)
+
+    def dataset(self, seed, prefix):
+        users = synthetic.create_tenants(2, 2, 3, seed, prefix=prefix)
+        return [
+            (user.email.removeprefix(prefix), conversation.title, conversation.message_count,
+             get_backend().get(conversation.id)["messages"])
+            for user in users
+            for conversation in Conversation.objects.filter(user=user).order_by("id")
+        ]
+
+    def test_tenants_are_reproducible(self):
+        first = self.dataset(3, "first")
+        self.assertEqual(len(first), 4)
+        self.assertTrue(all(count == 6 for _, _, count, _ in first))
+        self.assertEqual(first, self.dataset(3, "second"))
+        self.assertNotEqual(first, self.dataset(4, "third"))
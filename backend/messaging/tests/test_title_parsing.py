@@ -0,0 +1,90 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from messaging import mistral_functions
+from messaging.cancellation import GenerationCancelled
+from messaging.mistral_functions import MAX_TITLE_LENGTH, fallback_title, parse_title_and_reply, partial_reply
+
+FIRST = "How do I bake sourdough bread at home without a starter?"
+
+
+class ParseTitleAndReplyTests(SimpleTestCase):
+
+    def test_plain_json(self):
+        self.assertEqual(parse_title_and_reply('{"reply": "Hi!", "title": "Greeting"}', FIRST), ("Hi!", "Greeting"))
+
+    def test_fenced_json(self):
+        content = '```json\n{"reply": "Use yeast.", "title": "Bread basics"}\n```'
+        self.assertEqual(parse_title_and_reply(content, FIRST), ("Use yeast.", "Bread basics"))
+
+    def test_prose_around_the_object(self):
+        content = 'Sure, here it is: {"reply": "Use {braces} freely.", "title": "\\"Quoted\\""} Hope that helps.'
+        self.assertEqual(parse_title_and_reply(content, FIRST), ("Use {braces} freely.", "Quoted"))
+
+    def test_not_json(self):
+        content = "Just a plain answer."
+        self.assertEqual(parse_title_and_reply(content, FIRST), (content, fallback_title(FIRST)))
+
+    def test_non_dict_result(self):
+        for content in ('["reply", "title"]', '"reply"', "42"):
+            with self.subTest(content=content):
+                self.assertEqual(parse_title_and_reply(content, FIRST), (content, fallback_title(FIRST)))
+
+    def test_reply_not_a_string(self):
+        content = '{"reply": null, "title": "Empty"}'
+        self.assertEqual(parse_title_and_reply(content, FIRST), (content, fallback_title(FIRST)))
+
+    def test_missing_or_blank_title(self):
+        for content in ('{"reply": "Hi!"}', '{"reply": "Hi!", "title": "  "}', '{"reply": "Hi!", "title": 3}'):
+            with self.subTest(content=content):
+                self.assertEqual(parse_title_and_reply(content, FIRST), ("Hi!", "How do I bake sourdough bread"))
+
+    def test_long_title_is_truncated(self):
+        content = '{"reply": "Hi!", "title": "%s"}' % ("word " * 30)
+        reply, title = parse_title_and_reply(content, FIRST)
+        self.assertEqual(reply, "Hi!")
+        self.assertEqual(len(title), MAX_TITLE_LENGTH)
+
+
+class FallbackTitleTests(SimpleTestCase):
+
+    def test_first_words_of_the_first_line(self):
+        self.assertEqual(fallback_title("  Fix my code\nTraceback (most recent call last):"), "Fix my code")
+
+    def test_long_words_are_cut_at_a_word_boundary(self):
+        title = fallback_title(" ".join(["supercalifragilistic"] * 6))
+        self.assertLessEqual(len(title), MAX_TITLE_LENGTH)
+        self.assertFalse(title.endswith(" "))
+        self.assertEqual(title, " ".join(["supercalifragilistic"] * 2))
+
+    def test_empty_message(self):
+        self.assertEqual(fallback_title("   "), "New Chat")
+
+
+class PartialReplyTests(SimpleTestCase):
+
+    def test_reply_cut_off(self):
+        cases = {
+            '{"reply": "Hel': "Hel",
+            '{"title": "Greeting", "reply": "Say \\"hi': 'Say "hi',
+            '{"reply": "Line one\\nLine': "Line one\nLine",
+            '{"reply": "cut in an escape\\': "cut in an escape",
+            '{"reply": "caf\\u00e': "caf",
+            '{"reply": "done", "title": "Ti': "done",
+        }
+        for content, expected in cases.items():
+            with self.subTest(content=content):
+                self.assertEqual(partial_reply(content), expected)
+
+    def test_reply_not_started(self):
+        for content in ("", "{", '{"title": "Greeting", "re'):
+            with self.subTest(content=content):
+                self.assertEqual(partial_reply(content), "")
+
+    def test_plain_text_is_kept(self):
+        self.assertEqual(partial_reply("The model ignored JSON mode"), "The model ignored JSON mode")
+
+    def test_cancelled_combined_completion(self):
+        with mock.patch.object(mistral_functions, "_complete", side_effect=GenerationCancelled('{"reply": "Hel')):
+            with self.assertRaises(GenerationCancelled) as raised:
+                mistral_functions.send_message_with_title([{"role": "user", "content": FIRST}])
+        self.assertEqual(raised.exception.partial, "Hel")
@@ -0,0 +1,175 @@
+import uuid
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from messaging import jsoncodec, mistral_functions, search_index, tinydb_store
+from messaging.circuit_breaker import HALF_OPEN, CircuitBreaker
+from messaging.model_router import ModelRouter
+from messaging.models import Conversation
+from messaging.tests.utils import QueryBudgetTestCase
+from messaging.tinydb_store import MessageStore
+
+
+class UpstreamResponseTests(QueryBudgetTestCase):
+    # The real title request against a stubbed HTTP layer.
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+        breaker = CircuitBreaker("a")
+        for patcher in (
+            mock.patch("messaging.views.get_title", mistral_functions.get_title),
+            mock.patch.object(mistral_functions, "router", ModelRouter({"title": [{"model": "a", "timeout": 5}]})),
+            mock.patch.object(mistral_functions, "get_model_breaker", lambda model: breaker),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings = override_settings(COMBINED_TITLE_REPLY=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def send(self, body):
+        response = mock.Mock(status_code=200, content=body, text=body.decode())
+        with mock.patch.object(mistral_functions.requests, "post", return_value=response):
+            return self.client.post("/messaging/send/", {"text": "Hi"}, format="json")
+
+    def test_completion_without_choices_is_a_bad_gateway(self):
+        response = self.send(b'{"id": "cmpl-1", "object": "error"}')
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("Invalid upstream response", response.data["error"])
+        self.assertFalse(Conversation.objects.exists())
+
+
+class ImportTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def upload(self, lines):
+        content = "".join(jsoncodec.dumps(line).decode() + "\n" if isinstance(line, dict) else line for line in lines)
+        upload = SimpleUploadedFile("conversations.ndjson", content.encode("utf-8", "surrogateescape"),
+                                    content_type="application/x-ndjson")
+        return self.client.post("/messaging/import/", {"file": upload}, format="multipart")
+
+    def test_bad_last_line_imports_nothing(self):
+        response = self.upload([
+            {"type": "export", "version": 1},
+            {"type": "conversation", "id": 1, "title": "First"},
+            {"type": "message", "conversation_id": 1, "role": "user", "content": "imported words"},
+            {"type": "conversation", "id": 2, "title": "Second"},
+            {"type": "message", "conversation_id": 2, "role": "user", "content": "imported words"},
+            "{not json\n",
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Line 6", response.data["error"])
+        self.assertFalse(Conversation.objects.exists())
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(search_index.search(self.user.id, "imported")[0], [])
+
+    def test_invalid_utf8_is_a_format_error(self):
+        response = self.upload([{"type": "conversation", "id": 1}, "\udcff\n"])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Line 2", response.data["error"])
+        self.assertFalse(Conversation.objects.exists())
+
+
+class StreamingResponse:
+    # A streamed completion that calls `after_chunk(i)` after sending chunk i.
+
+    status_code = 200
+
+    def __init__(self, chunks, after_chunk):
+        self.chunks = chunks
+        self.after_chunk = after_chunk
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        for i, content in enumerate(self.chunks):
+            yield "data: " + jsoncodec.dumps({"choices": [{"delta": {"content": content}}]}).decode()
+            self.after_chunk(i)
+        yield "data: [DONE]"
+
+    def close(self):
+        self.closed = True
+
+
+class StreamCancelTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+        self.conversation_id = self.seed(self.user, 1, 1)[0]
+        # Half-open with room for one trial call, which the send takes.
+        self.breaker = CircuitBreaker("a", failure_threshold=1, reset_timeout=0)
+        self.breaker.record_failure("down")
+        for patcher in (
+            mock.patch.object(tinydb_store, "send_message", mistral_functions.send_message),
+            mock.patch.object(mistral_functions, "router", ModelRouter({"chat": [{"model": "a", "timeout": 5}]})),
+            mock.patch.object(mistral_functions, "get_model_breaker", lambda model: self.breaker),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cancel_stops_at_the_next_chunk(self):
+        def cancel_after_second_chunk(i):
+            if i == 1:
+                response = self.client.post("/messaging/cancel/", {"conversation_id": self.conversation_id},
+                                            format="json")
+                self.assertEqual(response.data["cancelled"], 1)
+
+        upstream = StreamingResponse(["Hel", "lo", " there"], cancel_after_second_chunk)
+        with mock.patch.object(mistral_functions.requests, "post", return_value=upstream):
+            response = self.client.post("/messaging/send/", {"conversation_id": self.conversation_id, "text": "Hi"},
+                                        format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["cancelled"])
+        self.assertEqual(response.data["content"], "Hello")
+        self.assertTrue(upstream.closed)
+        reply = MessageStore.get_messages(self.conversation_id)[-1]
+        self.assertEqual((reply["role"], reply["content"], reply["status"]), ("assistant", "Hello", "cancelled"))
+
+        # Neither a success nor a failure, and the trial slot is free again.
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.snapshot()["failures"], 1)
+        self.breaker.before_call()
+
+
+class IdValidationTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def test_send_message(self):
+        for conversation_id in ("abc", "1.5", 1.5, True, [1], {"id": 1}):
+            with self.subTest(conversation_id=conversation_id):
+                response = self.client.post("/messaging/send/", {"conversation_id": conversation_id, "text": "Hi"},
+                                            format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "conversation_id must be an integer")
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_send_message_accepts_numeric_strings(self):
+        conversation_id = self.seed(self.user, 1, 1)[0]
+        response = self.client.post("/messaging/send/", {"conversation_id": str(conversation_id), "text": "Hi"},
+                                    format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["conversation_id"], conversation_id)
+
+    def test_cancel(self):
+        for data in ({"job_id": "not-a-uuid"}, {"job_id": 12}, {"conversation_id": "abc"},
+                     {"conversation_id": False}, {"conversation_id": [1]}):
+            with self.subTest(data=data):
+                response = self.client.post("/messaging/cancel/", data, format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "job_id must be a UUID and conversation_id an integer")
+
+    def test_cancel_unknown_job(self):
+        response = self.client.post("/messaging/cancel/", {"job_id": str(uuid.uuid4())}, format="json")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,123 @@
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+from messaging import tinydb_store
+from messaging.tinydb_store import MessageStore
+
+User = get_user_model()
+
+# Dataset sizes every budget is checked against: (conversations, user/assistant turns each).
+SIZES = ((1, 1), (10, 5), (40, 20))
+
+STORE_OPERATIONS = {"get", "search", "insert", "update", "remove", "all", "contains", "count"}
+
+
+class CountingTable:
+    # Wraps a TinyDB table and records every operation on it.
+
+    def __init__(self, table):
+        self._table = table
+        self.operations = []
+
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if name not in STORE_OPERATIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.operations.append(name)
+            return attr(*args, **kwargs)
+        return counted
+
+    def __iter__(self):
+        self.operations.append("iter")
+        return iter(self._table)
+
+    def __len__(self):
+        return len(self._table)
+
+
+def fake_send_message(messages, model=None, cancel_token=None, usage=None):
+    return f"Reply to: {messages[-1]['content']}", "2025-01-01T12:00:00"
+
+
+def fake_send_message_with_title(messages, model=None, cancel_token=None, usage=None):
+    return f"Reply to: {messages[-1]['content']}", "Test title", "2025-01-01T12:00:00"
+
+
+def fake_get_title(message, model=None):
+    return "Test title"
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Runs requests against an in-memory message store with the upstream
+    stubbed, and checks the number of database queries and message store
+    operations each request makes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.table = CountingTable(TinyDB(storage=MemoryStorage).table("conversations"))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(tinydb_store, "conversations_table", self.table),
+            mock.patch.object(tinydb_store, "send_message", fake_send_message),
+            mock.patch.object(tinydb_store, "send_message_with_title", fake_send_message_with_title),
+            mock.patch("messaging.views.get_title", fake_get_title),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings = override_settings(
+            SEARCH_INDEX_PATH=f"{tmp.name}/search.sqlite3",
+            ARCHIVE_DIR=f"{tmp.name}/archive",
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_user(self, email="user@example.com", password="Secret-Passw0rd!", **extra):
+        extra.setdefault("email_verified", True)
+        return User.objects.create_user(email=email, password=password, **extra)
+
+    def client_for(self, user):
+        # Real JWT authentication, so the user lookup is part of the budget.
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def seed(self, user, conversations, turns):
+        ids = []
+        for i in range(conversations):
+            conversation_id = MessageStore.create_conversation(user.id, title=f"Conversation {i}")
+            messages = []
+            for turn in range(turns):
+                messages.append({"role": "user", "content": f"question {turn}", "timestamp": "2025-01-01T12:00:00"})
+                messages.append({"role": "assistant", "content": f"answer {turn}", "timestamp": "2025-01-01T12:00:01"})
+            MessageStore.append_messages(conversation_id, messages)
+            ids.append(conversation_id)
+        return ids
+
+    @contextmanager
+    def assertBudget(self, queries, store_ops=0):
+        self.table.operations.clear()
+        with CaptureQueriesContext(connection) as captured:
+            yield
+        executed = "\n".join(q["sql"] for q in captured.captured_queries)
+        self.assertLessEqual(
+            len(captured), queries,
+            f"{len(captured)} queries, budget is {queries}:\n{executed}",
+        )
+        self.assertLessEqual(
+            len(self.table.operations), store_ops,
+            f"{len(self.table.operations)} message store operations, budget is {store_ops}: {self.table.operations}",
+        )
@@ -1,72 +1,339 @@
+import logging
+import os
+import sqlite3
+import threading
 from tinydb import TinyDB, Query
+from tinydb.storages import Storage, touch
 from datetime import datetime
+from django.utils import timezone
 from .models import Conversation
 from .mistral_functions import *
+from . import archive, context, encoding, jsoncodec, search_index, stats, vector_index
+from .store_backends import StoreBackend, page_slice, get_backend
+from .cancellation import GenerationCancelled
 
-db = TinyDB('appdata.json')
+logger = logging.getLogger(__name__)
+
+
+class CodecJSONStorage(Storage):
+    # TinyDB's JSONStorage with the JSON_CODEC codec, which matters because
+    # every table operation decodes and re-encodes the whole file. Files
+    # written by JSONStorage read back unchanged.
+
+    def __init__(self, path):
+        touch(path, create_dirs=False)
+        self._handle = open(path, "r+b")
+
+    def read(self):
+        self._handle.seek(0)
+        data = self._handle.read()
+        return jsoncodec.loads(data) if data else None
+
+    def write(self, data):
+        self._handle.seek(0)
+        self._handle.write(jsoncodec.dumps(data))
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.truncate()
+
+    def close(self):
+        self._handle.close()
+
+
+db = TinyDB('appdata.json', storage=CodecJSONStorage)
 
 conversations_table = db.table('conversations')
 messages_table = db.table('messages')
 
+# TinyDB is not thread-safe: every table operation reads and rewrites the
+# whole file, so concurrent requests (or batch workers) must not interleave.
+# Upstream calls are made outside this lock.
+_lock = threading.RLock()
+
+def _rehydrate(conversation_json):
+    # Bring an archived conversation back into the hot store on first access.
+    if not conversation_json or "archived" not in conversation_json:
+        return conversation_json
+    messages = archive.read_messages(conversation_json["archived"])
+
+    def restore(doc):
+        doc["messages"] = messages
+        doc.pop("archived", None)
+
+    conversations_table.update(restore, doc_ids=[conversation_json.doc_id])
+    restore(conversation_json)
+    return conversation_json
+
+def _get_hot(conversation_id):
+    # The conversation record, rehydrated if it was archived. Call with _lock held.
+    q = Query()
+    return _rehydrate(conversations_table.get(q.conversation_id == conversation_id))
+
+def _decode(conversation_json, stored=None):
+    # Messages of a conversation record as dicts, whatever encoding version they were stored in.
+    if stored is None:
+        stored = conversation_json.get("messages", [])
+    return encoding.decode_messages(stored, conversation_json.get("v", 1))
+
+def _append_encoded(conversation_json, new_messages):
+    # Stored messages with `new_messages` appended; older records are converted to the current encoding.
+    stored = encoding.upgrade(conversation_json.get("messages", []), conversation_json.get("v", 1))
+    return stored + encoding.encode_messages(new_messages)
+
+def _record(conversation_json):
+    return {k: conversation_json.get(k) for k in ("conversation_id", "user_id", "title", "created_at")}
+
+class TinyDBBackend(StoreBackend):
+    # Conversations in appdata.json, messages in the compact encoding, idle
+    # conversations moved to archive segments. The table is looked up at call
+    # time so it can be swapped out in tests.
+
+    def create(self, conversation_id, user_id, title, created_at):
+        conversation_json = {
+            "conversation_id": conversation_id,
+            "title": title,
+            "user_id": user_id,
+            "messages": [],
+            "created_at": created_at,
+            "v": encoding.ENCODING_VERSION
+        }
+        with _lock:
+            conversations_table.insert(conversation_json)
+
+    def bulk_load(self, records):
+        # One write of the table for all records.
+        docs = [{
+            "conversation_id": record["conversation_id"],
+            "title": record["title"],
+            "user_id": record["user_id"],
+            "messages": encoding.encode_messages(record["messages"]),
+            "created_at": record["created_at"],
+            "v": encoding.ENCODING_VERSION
+        } for record in records]
+        with _lock:
+            conversations_table.insert_multiple(docs)
+
+    def get(self, conversation_id):
+        with _lock:
+            conversation_json = _get_hot(conversation_id)
+        if conversation_json is None:
+            return None
+        return {**_record(conversation_json), "messages": _decode(conversation_json)}
+
+    def page(self, conversation_id, offset=0, limit=None):
+        with _lock:
+            conversation_json = _get_hot(conversation_id)
+        if conversation_json is None:
+            return None
+        stored = conversation_json.get("messages", [])
+        # Only the messages of the page are decoded.
+        return _decode(conversation_json, page_slice(stored, offset, limit)), len(stored)
+
+    def append(self, conversation_id, messages):
+        # Appends to the record as it is at the time of the call; only the new
+        # messages are encoded, stored ones are kept as they are.
+        q = Query()
+        with _lock:
+            conversation_json = _get_hot(conversation_id)
+            if conversation_json is None:
+                return None
+            start = len(conversation_json.get("messages", []))
+            stored = _append_encoded(conversation_json, messages)
+            conversations_table.update({"messages": stored, "v": encoding.ENCODING_VERSION}, q.conversation_id == conversation_id)
+        return start
+
+    def list_conversations(self, user_id):
+        q = Query()
+        with _lock:
+            return [_record(doc) for doc in conversations_table.search(q.user_id == user_id)]
+
+    def set_title(self, conversation_id, title):
+        q = Query()
+        with _lock:
+            conversations_table.update({"title": title}, q.conversation_id == conversation_id)
+
+    def delete(self, conversation_id):
+        q = Query()
+        with _lock:
+            conversations_table.remove(q.conversation_id == conversation_id)
+
+    def iter_conversations(self, user_id=None):
+        # One read of the table; records are decoded one at a time. Archived
+        # conversations are read in place, not moved back to the hot store.
+        with _lock:
+            if user_id is None:
+                docs = list(conversations_table)
+            else:
+                docs = conversations_table.search(Query().user_id == user_id)
+        for doc in docs:
+            yield {**_record(doc), "messages": MessageStore.load_messages(doc)}
+
+    def archive(self, conversation_ids):
+        conversation_ids = set(conversation_ids)
+        # TinyDB hands update callables plain dicts without doc_id, so the
+        # stubs are looked up by conversation ID.
+        stubs = {}
+        doc_ids = []
+        with _lock:
+            with archive.SegmentWriter() as writer:
+                for doc in conversations_table:
+                    if doc["conversation_id"] in conversation_ids and "archived" not in doc and doc.get("messages"):
+                        stubs[doc["conversation_id"]] = writer.write(doc["messages"])
+                        doc_ids.append(doc.doc_id)
+
+            def to_stub(doc):
+                doc["archived"] = stubs[doc["conversation_id"]]
+                doc["messages"] = []
+
+            # One write of the table for the whole batch. If it fails, the
+            # segment is unreferenced and removed by the next cleanup.
+            if doc_ids:
+                conversations_table.update(to_stub, doc_ids=doc_ids)
+        return len(stubs)
+
+    def remove_unused_archive_segments(self):
+        # Held through the deletes: a segment written by a concurrent
+        # archive() isn't referenced until its stubs are, and would be removed.
+        with _lock:
+            referenced = {doc["archived"]["segment"] for doc in conversations_table if "archived" in doc}
+            return archive.remove_unreferenced_segments(referenced)
+
 class MessageStore:
     @staticmethod
     def get_conversations_by_user(user_id):
         # Retrieve all conversations for a specific user.
-        q = Query()
-        return conversations_table.search(q.user_id == user_id)
+        return get_backend().list_conversations(user_id)
 
     @staticmethod
     def get_conversation(conversation_id):
         # Retrieve a specific conversation by its ID.
-        q = Query()
-        conversation = conversations_table.get(q.conversation_id == conversation_id)
-        return conversation
+        return get_backend().get(conversation_id)
 
     @staticmethod
     def create_conversation(user_id, title="New Chat"):
         # Create a new conversation and return its ID.
         conversation = Conversation.objects.create(title=title, user_id=user_id)
         conversation_id = conversation.id
-        created_at = conversation.created_at.isoformat()
-        conversation_json = {
-            "conversation_id": conversation_id,
-            "title": title,
-            "user_id": user_id,
-            "messages": [],
-            "created_at": created_at
-        }
-        conversations_table.insert(conversation_json)
+        get_backend().create(conversation_id, user_id, title, conversation.created_at.isoformat())
         return conversation_id
 
     @staticmethod
-    def add_message(conversation_id, text, sender="user", title="New Chat", user_id=None):
+    def add_message(conversation_id, text, sender="user", title="New Chat", user_id=None, with_title=False,
+                    cancel_token=None):
 
-        # Add a message to a conversation. If the conversation doesn't exist it will be created first.
-        q = Query()
-        try:
-            conversation = Conversation.objects.filter(id=conversation_id).first()
-            conversation_json = conversations_table.get(q.conversation_id == conversation_id)
-            messages = conversation_json.get("messages", []) if conversation_json else []
-        except Conversation.DoesNotExist:
+        # Add a message to a conversation and the model's reply to it. Returns None if the conversation doesn't exist.
+        # If `cancel_token` is cancelled mid-generation, the partial reply is stored marked as cancelled
+        # and GenerationCancelled is raised.
+        backend = get_backend()
+        conversation_json = backend.get(conversation_id)
+        if conversation_json is None:
             return None
-        
+        messages = conversation_json["messages"]
         message = {
             "role": sender,"content": text, "timestamp": datetime.now().isoformat()
         }
 
         # Append
         messages.append(message)
-        messages_no_date = [{"role": m["role"], "content": m["content"]} for m in messages if "role" in m and "content" in m]
-        send_message_response, response_timestamp = send_message(messages_no_date)
-        messages.append({"role": "assistant", "content": send_message_response, "timestamp": response_timestamp})
+        messages_no_date, query_vector = context.select(conversation_id, messages)
+        cancelled = None
+        usage = {}
+        try:
+            if with_title:
+                # Reply and title from a single completion.
+                send_message_response, title, response_timestamp = send_message_with_title(
+                    messages_no_date, cancel_token=cancel_token, usage=usage)
+                backend.set_title(conversation_id, title)
+            else:
+                send_message_response, response_timestamp = send_message(
+                    messages_no_date, cancel_token=cancel_token, usage=usage)
+        except GenerationCancelled as e:
+            cancelled = e
+            send_message_response, response_timestamp = e.partial, datetime.now().isoformat()
+        reply = {"role": "assistant", "content": send_message_response, "timestamp": response_timestamp}
+        if cancelled is not None:
+            reply["status"] = "cancelled"
+        messages.append(reply)
+
+        # Keeps the sidebar listing and the retention job's idle age accurate in one query.
+        fields = stats.appended(messages[-2:], tokens=usage.get("total_tokens") or 0, at=timezone.now())
+        if with_title and cancelled is None:
+            fields["title"] = title
+        Conversation.objects.filter(id=conversation_id).update(**fields)
 
-        conversations_table.update({"messages": messages}, q.conversation_id == conversation_id)
+        # Append to the record as it is now, not as it was read before the
+        # upstream call, so concurrent turns on the same conversation are kept.
+        start = backend.append(conversation_id, messages[-2:])
+        if start is not None:
+            try:
+                search_index.index_messages(conversation_id, conversation_json["user_id"], messages[-2:], start=start)
+            except sqlite3.Error:
+                # The index can be rebuilt with `manage.py rebuild_search_index`.
+                logger.exception("Failed to index messages of conversation %s", conversation_id)
+            context.record(conversation_id, start, messages[-2:], query_vector)
+        if cancelled is not None:
+            raise cancelled
         return send_message_response
 
     @staticmethod
     def get_messages(conversation_id):
         
         # Retrieve all messages for a specific conversation.
-        q = Query()
-        conversation = conversations_table.get(q.conversation_id == conversation_id)
-        return conversation.get("messages", []) if conversation else []
+        conversation = get_backend().get(conversation_id)
+        return conversation["messages"] if conversation else []
+
+    @staticmethod
+    def get_messages_page(conversation_id, offset=0, limit=None):
+        # (messages, total) for a slice of a conversation; a negative offset counts from the end.
+        return get_backend().page(conversation_id, offset, limit) or ([], 0)
+
+    @staticmethod
+    def append_messages(conversation_id, new_messages, user_id=None):
+        # Append already complete messages (e.g. imported ones) without calling the model.
+        # Passing the owner's `user_id` saves reading the conversation first.
+        backend = get_backend()
+        if user_id is None:
+            conversation_json = backend.get(conversation_id)
+            if conversation_json is None:
+                return None
+            user_id = conversation_json["user_id"]
+        start = backend.append(conversation_id, new_messages)
+        if start is None:
+            return None
+        Conversation.objects.filter(id=conversation_id).update(**stats.appended(new_messages))
+
+        try:
+            search_index.index_messages(conversation_id, user_id, new_messages, start=start)
+        except sqlite3.Error:
+            logger.exception("Failed to index messages of conversation %s", conversation_id)
+        return start + len(new_messages)
+
+    @staticmethod
+    def set_title(conversation_id, title):
+        Conversation.objects.filter(id=conversation_id).update(title=title)
+        get_backend().set_title(conversation_id, title)
+
+    @staticmethod
+    def delete_conversation(conversation_id):
+        # Remove a conversation and its messages.
+        Conversation.objects.filter(id=conversation_id).delete()
+        get_backend().delete(conversation_id)
+        search_index.remove_conversation(conversation_id)
+        vector_index.remove(conversation_id)
+
+    @staticmethod
+    def archive_conversations(conversation_ids):
+        # Move the messages of the given conversations to a compressed archive
+        # segment, leaving stubs in the hot store. Returns the number archived.
+        return get_backend().archive(conversation_ids)
+
+    @staticmethod
+    def remove_unused_archive_segments():
+        return get_backend().remove_unused_archive_segments()
+
+    @staticmethod
+    def load_messages(conversation_json):
+        # Messages of a stored TinyDB record without moving archived ones back to the hot store.
+        if "archived" in conversation_json:
+            return _decode(conversation_json, archive.read_messages(conversation_json["archived"]))
+        return _decode(conversation_json)
@@ -1,8 +1,18 @@
 from django.urls import path
-from .views import send_message, get_messages, get_conversations
+from .views import (send_message, get_messages, get_conversations, search_messages, upstream_status,
+                    export_conversations, import_conversations, send_batch, get_job,
+                    cancel_generation, bootstrap)
 
 urlpatterns = [
     path("send/", send_message, name="send_message"),
+    path("jobs/<uuid:job_id>/", get_job, name="get_job"),
+    path("cancel/", cancel_generation, name="cancel_generation"),
     path("messages/", get_messages, name="get_messages"),
     path("conversations/", get_conversations, name="get_conversations"),
+    path("bootstrap/", bootstrap, name="bootstrap"),
+    path("batch/", send_batch, name="send_batch"),
+    path("search/", search_messages, name="search_messages"),
+    path("export/", export_conversations, name="export_conversations"),
+    path("import/", import_conversations, name="import_conversations"),
+    path("upstream/status/", upstream_status, name="upstream_status"),
 ]
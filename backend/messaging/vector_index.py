@@ -0,0 +1,97 @@
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from .embeddings import get_embedder
+
+# Per-conversation embedding matrices for retrieval-based context selection.
+# Row i of VECTOR_DIR/conversation-<id>.npy is the float32 embedding of the
+# message at position i of the conversation, written once when the message is
+# stored. Messages without text get a zero row so positions stay aligned.
+
+_lock = threading.Lock()
+
+
+def _path(conversation_id):
+    return os.path.join(str(settings.VECTOR_DIR), f"conversation-{conversation_id}.npy")
+
+
+def load(conversation_id):
+    # The stored matrix, or None if the conversation has none yet.
+    try:
+        return np.load(_path(conversation_id))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save(conversation_id, matrix):
+    os.makedirs(str(settings.VECTOR_DIR), exist_ok=True)
+    path = _path(conversation_id)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp, path)
+
+
+def embed_messages(messages):
+    texts = [m.get("content") or "" for m in messages]
+    rows = [i for i, text in enumerate(texts) if text.strip()]
+    if not rows:
+        return None
+    embedded = get_embedder().embed([texts[i] for i in rows])
+    vectors = np.zeros((len(texts), embedded.shape[1]), dtype=np.float32)
+    vectors[rows] = embedded
+    return vectors
+
+
+def append(conversation_id, start, vectors):
+    # Store `vectors` as the rows of the messages at positions start, start + 1, ...
+    # Returns False (and stores nothing) if the matrix does not end at `start`
+    # or was made by another embedder; ensure() catches up the next time the
+    # context is built.
+    with _lock:
+        matrix = load(conversation_id)
+        rows = 0 if matrix is None else len(matrix)
+        if rows != start or (matrix is not None and matrix.shape[1] != vectors.shape[1]):
+            return False
+        if matrix is not None:
+            vectors = np.concatenate([matrix, vectors])
+        _save(conversation_id, vectors.astype(np.float32, copy=False))
+        return True
+
+
+def ensure(conversation_id, messages, dim):
+    # Matrix with a row for every message of `messages`, embedding the ones
+    # that are missing (history from before retrieval was enabled, or turns
+    # whose embedding failed).
+    matrix = load(conversation_id)
+    if matrix is None or matrix.shape[1] != dim or len(matrix) > len(messages):
+        matrix = np.zeros((0, dim), dtype=np.float32)
+    if len(matrix) < len(messages):
+        missing = embed_messages(messages[len(matrix):])
+        if missing is None:
+            missing = np.zeros((len(messages) - len(matrix), dim), dtype=np.float32)
+        matrix = np.concatenate([matrix, missing])
+        with _lock:
+            _save(conversation_id, matrix)
+    return matrix[:len(messages)]
+
+
+def top_k(matrix, query, k):
+    # Positions of the `k` rows most similar to `query`, in chronological order.
+    if k <= 0 or not len(matrix):
+        return []
+    scores = matrix @ query
+    if k < len(scores):
+        picked = np.argpartition(-scores, k - 1)[:k]
+    else:
+        picked = np.arange(len(scores))
+    # Rows sharing nothing with the query (e.g. messages without text) are dropped.
+    return sorted(int(i) for i in picked if scores[i] > 0)
+
+
+def remove(conversation_id):
+    try:
+        os.remove(_path(conversation_id))
+    except FileNotFoundError:
+        pass
@@ -1,42 +1,107 @@
+import math
+import uuid
 from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from datetime import datetime
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from authentication.serializer import UserSerializer
 from .serializer import ConversationSerializer
 from .tinydb_store import *
-from .models import Conversation
-from .mistral_functions import get_title
+from .models import Conversation, GenerationJob
+from .mistral_functions import get_title, router, UpstreamError
+from .circuit_breaker import CircuitOpenError, all_breakers
+from . import search_index
+from .export import ImportFormatError, import_stream, iter_export
+from .batch import run_batch
+from . import cancellation, jobs
+from .cancellation import CancelToken, GenerationCancelled
+
+def upstream_unavailable(e):
+    # Fail fast while the breaker is open instead of tying up the worker.
+    response = Response({"error": str(e), "retry_after": int(e.retry_after)}, status=503)
+    response["Retry-After"] = str(int(e.retry_after))
+    return response
+
+def parse_conversation_id(value):
+    # A conversation ID sent as a JSON number or a numeric form field.
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"invalid conversation ID {value!r}")
+    return int(value)
+
+def parse_job_id(value):
+    if not isinstance(value, str):
+        raise ValueError(f"invalid job ID {value!r}")
+    return uuid.UUID(value)
 
 # Create your views here.
 
-@permission_classes([IsAuthenticated])
 @api_view(["POST"])
+@permission_classes([IsAuthenticated])
 def send_message(request):
     conversation_id = request.data.get("conversation_id")
     text = request.data.get("text")
     user_id = request.user.id
     if not text:
         return Response({"error": "Text is required"}, status=400)
+    if conversation_id is not None:
+        try:
+            conversation_id = parse_conversation_id(conversation_id)
+        except ValueError:
+            return Response({"error": "conversation_id must be an integer"}, status=400)
+
+    if request.data.get("async"):
+        return send_message_async(request, conversation_id, text)
     
-    if conversation_id is None:
+    with_title = False
+    if conversation_id is None and settings.COMBINED_TITLE_REPLY:
+        # The title comes back with the first reply, see add_message().
+        conversation_id = MessageStore.create_conversation(user_id)
+        with_title = True
+
+    elif conversation_id is None:
         try:
             title = get_title(text)
             conversation_id = MessageStore.create_conversation(user_id, title=title)
 
+        except CircuitOpenError as e:
+            return upstream_unavailable(e)
+        except UpstreamError as e:
+            return Response({"error": str(e)}, status=502)
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
     else:
-        conversation = Conversation.objects.filter(id=conversation_id, user_id=user_id).first()
-        if conversation is None:
+        if not Conversation.objects.filter(id=conversation_id, user_id=user_id).exists():
             return Response({"error": "Conversation not found for the user"}, status=404)
 
-        conversation_json = MessageStore.get_conversation(conversation_id)
-        if conversation_json is None:
-            return Response({"error": "Conversation not found for the user"}, status=404)
-
-    response_message = MessageStore.add_message(conversation_id, text)
+    # Lets POST /messaging/cancel/ stop this generation while we wait for it.
+    token = CancelToken()
+    cancellation.register(token, ("conversation", conversation_id))
+    try:
+        response_message = MessageStore.add_message(conversation_id, text, with_title=with_title, cancel_token=token)
+    except GenerationCancelled as e:
+        return Response({
+            "message": "Generation cancelled",
+            "cancelled": True,
+            "content": e.partial,
+            "conversation_id": conversation_id,
+            "timestamp": datetime.now().isoformat()
+        }, status=200)
+    except (CircuitOpenError, UpstreamError) as e:
+        if with_title:
+            # Don't leave an empty "New Chat" behind when the first turn failed.
+            MessageStore.delete_conversation(conversation_id)
+        if isinstance(e, CircuitOpenError):
+            return upstream_unavailable(e)
+        return Response({"error": str(e)}, status=502)
+    finally:
+        cancellation.unregister(token, ("conversation", conversation_id))
+    if response_message is None:
+        # Known to the database but missing from the message store.
+        return Response({"error": "Conversation not found for the user"}, status=404)
     return Response({
         "message": "Message sent successfully", 
         "content": response_message, 
@@ -44,8 +109,75 @@ def send_message(request):
         "timestamp": datetime.now().isoformat()
     }, status=201)
 
+def send_message_async(request, conversation_id, text):
+    # Queue the generation and answer right away; the result is fetched from get_job().
+    user_id = request.user.id
+    generate_title = conversation_id is None
+    if generate_title:
+        conversation_id = MessageStore.create_conversation(user_id)
+    elif not Conversation.objects.filter(id=conversation_id, user_id=user_id).exists():
+        return Response({"error": "Conversation not found for the user"}, status=404)
+
+    job = jobs.submit(user_id, conversation_id, text, generate_title=generate_title)
+    return Response({
+        "message": "Message queued",
+        "job_id": str(job.id),
+        "conversation_id": conversation_id,
+        "status": job.status,
+    }, status=202)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_job(request, job_id):
+    job = GenerationJob.objects.filter(id=job_id, user_id=request.user.id).first()
+    if job is None:
+        return Response({"error": "Job not found"}, status=404)
+    try:
+        wait = float(request.query_params.get("wait", 0))
+    except ValueError:
+        wait = math.nan
+    if not math.isfinite(wait):
+        return Response({"error": "wait must be a number of seconds"}, status=400)
+    wait = min(max(wait, 0), settings.JOB_MAX_WAIT)
+
+    job = jobs.wait(job, wait)
+    return Response(jobs.serialize(job), status=200)
+
+@api_view(["POST"])
 @permission_classes([IsAuthenticated])
+def cancel_generation(request):
+    # Stop in-flight generations of a job or of every turn of a conversation.
+    job_id = request.data.get("job_id")
+    conversation_id = request.data.get("conversation_id")
+    user_id = request.user.id
+    try:
+        if job_id:
+            job_id = parse_job_id(job_id)
+        elif conversation_id is not None:
+            conversation_id = parse_conversation_id(conversation_id)
+    except ValueError:
+        return Response({"error": "job_id must be a UUID and conversation_id an integer"}, status=400)
+
+    if job_id:
+        job = GenerationJob.objects.filter(id=job_id, user_id=user_id).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=404)
+        if job.status in GenerationJob.FINISHED:
+            return Response({"error": f"Job already {job.status}"}, status=409)
+        cancelled = jobs.cancel(GenerationJob.objects.filter(id=job.id))
+    elif conversation_id is not None:
+        if not Conversation.objects.filter(id=conversation_id, user_id=user_id).exists():
+            return Response({"error": "Conversation not found for the user"}, status=404)
+        cancelled = jobs.cancel(GenerationJob.objects.filter(conversation_id=conversation_id))
+        # Synchronous sends waiting in this process.
+        cancelled += cancellation.cancel(("conversation", conversation_id))
+    else:
+        return Response({"error": "job_id or conversation_id is required"}, status=400)
+
+    return Response({"message": "Cancellation requested", "cancelled": cancelled}, status=200)
+
 @api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def get_messages(request):
     conversation_id = request.query_params.get("conversation_id")
     user_id = request.user.id
@@ -65,10 +197,139 @@ def get_messages(request):
     
     return Response({"conversation_id": conversation_id, "messages": messages}, status=200)
 
-@permission_classes([IsAuthenticated])
 @api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def get_conversations(request):
     user_id = request.user.id
     conversations = Conversation.objects.filter(user_id=user_id).order_by('-updated_at')
     serializer = ConversationSerializer(conversations, many=True)
-    return Response({"conversations": serializer.data}, status=200)
\ No newline at end of file
+    return Response({"conversations": serializer.data}, status=200)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def bootstrap(request):
+    # Everything the chat page needs on load: the user, the most recently
+    # active conversations and the latest messages of the requested (or most
+    # recent) conversation. Two queries and one message store read; a third
+    # query if the requested conversation is not on the first page.
+    try:
+        page_size = min(max(int(request.query_params.get("page_size", 50)), 1), 200)
+        message_limit = min(max(int(request.query_params.get("messages", 50)), 1), 500)
+        conversation_id = request.query_params.get("conversation_id")
+        conversation_id = int(conversation_id) if conversation_id else None
+    except ValueError:
+        return Response({"error": "page_size, messages and conversation_id must be integers"}, status=400)
+
+    conversations = list(Conversation.objects.filter(user_id=request.user.id).order_by('-updated_at')[:page_size + 1])
+    has_more = len(conversations) > page_size
+    conversations = conversations[:page_size]
+
+    if conversation_id is None:
+        active = conversations[0] if conversations else None
+    else:
+        active = next((c for c in conversations if c.id == conversation_id), None)
+        if active is None:
+            active = Conversation.objects.filter(id=conversation_id, user_id=request.user.id).first()
+            if active is None:
+                return Response({"error": "Conversation not found for the user"}, status=404)
+
+    messages, total = [], 0
+    if active is not None:
+        messages, total = MessageStore.get_messages_page(active.id, offset=-message_limit, limit=message_limit)
+
+    return Response({
+        "user": UserSerializer(request.user).data,
+        "conversations": ConversationSerializer(conversations, many=True).data,
+        "has_more_conversations": has_more,
+        "conversation_id": active.id if active is not None else None,
+        "messages": messages,
+        "messages_total": total,
+        "messages_offset": max(total - message_limit, 0),
+    }, status=200)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_messages(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "Query is required"}, status=400)
+    try:
+        page = max(int(request.query_params.get("page", 1)), 1)
+        page_size = min(max(int(request.query_params.get("page_size", 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "page and page_size must be integers"}, status=400)
+
+    hits, has_more = search_index.search(request.user.id, query, limit=page_size, offset=(page - 1) * page_size)
+    titles = dict(
+        Conversation.objects.filter(id__in={hit["conversation_id"] for hit in hits}).values_list("id", "title")
+    )
+    for hit in hits:
+        hit["conversation_title"] = titles.get(hit["conversation_id"])
+
+    return Response({
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "results": hits,
+    }, status=200)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_conversations(request):
+    response = StreamingHttpResponse(iter_export(request.user.id), content_type="application/x-ndjson")
+    response["Content-Disposition"] = 'attachment; filename="conversations.ndjson"'
+    return response
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def import_conversations(request):
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"error": "An NDJSON file is required"}, status=400)
+    try:
+        stats = import_stream(request.user.id, upload)
+    except ImportFormatError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"message": "Import completed", **stats}, status=201)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def send_batch(request):
+    items = request.data.get("items")
+    if not isinstance(items, list) or not items:
+        return Response({"error": "items must be a non-empty list"}, status=400)
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return Response({"error": f"At most {settings.BATCH_MAX_ITEMS} items per batch"}, status=400)
+    for item in items:
+        conversation_id = item.get("conversation_id") if isinstance(item, dict) else None
+        if (not isinstance(conversation_id, int) or isinstance(conversation_id, bool)
+                or not isinstance(item.get("text"), str) or not item["text"]):
+            return Response({"error": "Each item needs an integer conversation_id and a text"}, status=400)
+
+    # Ownership of every conversation in one query.
+    requested = {item["conversation_id"] for item in items}
+    owned = set(Conversation.objects.filter(id__in=requested, user_id=request.user.id).values_list("id", flat=True))
+
+    results = [None] * len(items)
+    allowed = []
+    for index, item in enumerate(items):
+        if item["conversation_id"] in owned:
+            allowed.append((index, item))
+        else:
+            results[index] = {"index": index, "conversation_id": item["conversation_id"], "status": 404,
+                              "error": "Conversation not found for the user"}
+
+    batch_results = run_batch([item for _, item in allowed])
+    for (index, _), result in zip(allowed, batch_results):
+        results[index] = {**result, "index": index}
+
+    return Response({"results": results}, status=207)
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def upstream_status(request):
+    return Response({
+        "circuits": [breaker.snapshot() for breaker in all_breakers()],
+        "models": router.snapshot(),
+    }, status=200)
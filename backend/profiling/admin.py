@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import ProfileCapture
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'wall_time', 'cpu_time', 'clock', 'trigger', 'user', 'size', 'file_name']
+    list_select_related = ['user']
+    list_filter = ['trigger', 'clock', 'method', 'status_code', 'created_at']
+    search_fields = ['path', 'file_name', 'user__email']
+    readonly_fields = [f.name for f in ProfileCapture._meta.fields] + ['file_path']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        # Captures are only made by the middleware.
+        return False
@@ -0,0 +1,89 @@
+import cProfile
+import logging
+import random
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from . import storage
+from .models import ProfileCapture
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests with cProfile. Staff users opt in per request
+    with an `X-Profile` header ("wall", the default, or "cpu" for a profile
+    timed with thread CPU time); a PROFILING_SAMPLE_RATE share of all other
+    requests is profiled on wall-clock time. The response of a profiled
+    request carries the ProfileCapture id in `X-Profile-Id`.
+
+    It should be the first middleware so the rest of the stack is included.
+    API requests authenticate inside the view, so the staff check decodes the
+    JWT access token itself.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger, clock, user_id = self._decide(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile(time.thread_time if clock == ProfileCapture.CPU else time.perf_counter)
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread.
+            return self.get_response(request)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        wall_time, cpu_time = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+        user = getattr(request, "user", None)
+        if user_id is None and user is not None and user.is_authenticated:
+            user_id = user.pk
+        try:
+            capture = storage.save(profiler, request, response, trigger, clock, wall_time, cpu_time, user_id)
+        except Exception:
+            # Profiling must never break the request it observes.
+            logger.exception("Failed to save the profile of %s %s", request.method, request.path)
+            capture = None
+        if capture is not None:
+            response["X-Profile-Id"] = str(capture.pk)
+        return response
+
+    def _decide(self, request):
+        # (trigger, clock, staff user id) for requests to profile, (None, None, None) for the rest.
+        requested = request.META.get("HTTP_X_PROFILE", "").strip().lower()
+        if requested:
+            user_id = self._staff_user_id(request)
+            if user_id is not None:
+                clock = ProfileCapture.CPU if requested == ProfileCapture.CPU else ProfileCapture.WALL
+                return ProfileCapture.HEADER, clock, user_id
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate > 0 and random.random() < rate:
+            return ProfileCapture.SAMPLE, ProfileCapture.WALL, None
+        return None, None, None
+
+    @staticmethod
+    def _staff_user_id(request):
+        header = request.META.get("HTTP_AUTHORIZATION", "").split()
+        if len(header) != 2 or header[0] not in api_settings.AUTH_HEADER_TYPES:
+            return None
+        try:
+            user_id = AccessToken(header[1])[api_settings.USER_ID_CLAIM]
+        except (TokenError, KeyError):
+            return None
+        if User.objects.filter(pk=user_id, is_staff=True, is_active=True).exists():
+            return user_id
+        return None
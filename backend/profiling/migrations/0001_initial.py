@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileCapture",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2048)),
+                ("status_code", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("trigger", models.CharField(choices=[("header", "Header"), ("sample", "Sample")], max_length=8)),
+                ("clock", models.CharField(choices=[("wall", "Wall clock"), ("cpu", "CPU")], default="wall", max_length=8)),
+                ("wall_time", models.FloatField(help_text="Seconds")),
+                ("cpu_time", models.FloatField(help_text="Seconds")),
+                ("file_name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveIntegerField(help_text="Bytes")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+import os
+from django.conf import settings
+from django.db import models
+
+
+class ProfileCapture(models.Model):
+    HEADER = "header"
+    SAMPLE = "sample"
+    TRIGGER_CHOICES = [(HEADER, "Header"), (SAMPLE, "Sample")]
+
+    WALL = "wall"
+    CPU = "cpu"
+    CLOCK_CHOICES = [(WALL, "Wall clock"), (CPU, "CPU")]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    trigger = models.CharField(max_length=8, choices=TRIGGER_CHOICES)
+    clock = models.CharField(max_length=8, choices=CLOCK_CHOICES, default=WALL)
+    wall_time = models.FloatField(help_text="Seconds")
+    cpu_time = models.FloatField(help_text="Seconds")
+    file_name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField(help_text="Bytes")
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def file_path(self):
+        return os.path.join(str(settings.PROFILING_DIR), self.file_name)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.wall_time * 1000:.0f} ms)"
@@ -0,0 +1,71 @@
+import os
+import re
+import uuid
+from django.conf import settings
+from django.utils import timezone
+from .models import ProfileCapture
+
+# Profiles are written as cProfile/pstats files (open them with
+# `python -m pstats`, snakeviz or similar). File names start with the capture
+# time, so sorting them by name sorts them by age; the oldest are removed once
+# there are more than PROFILING_MAX_FILES or they take more than
+# PROFILING_MAX_BYTES together.
+
+
+def _directory():
+    path = str(settings.PROFILING_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save(profiler, request, response, trigger, clock, wall_time, cpu_time, user_id=None):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-")[:80] or "root"
+    file_name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{request.method.lower()}-{slug}-{uuid.uuid4().hex[:8]}.prof"
+    path = os.path.join(_directory(), file_name)
+    profiler.dump_stats(path)
+    size = os.path.getsize(path)
+    if size > settings.PROFILING_MAX_BYTES:
+        # Keeping it would evict every other capture.
+        os.remove(path)
+        return None
+
+    capture = ProfileCapture.objects.create(
+        user_id=user_id,
+        method=request.method,
+        path=request.get_full_path()[:2048],
+        status_code=getattr(response, "status_code", None),
+        trigger=trigger,
+        clock=clock,
+        wall_time=wall_time,
+        cpu_time=cpu_time,
+        file_name=file_name,
+        size=size,
+    )
+    rotate()
+    return capture
+
+
+def rotate():
+    # Remove the oldest captures until both caps are met; returns how many were removed.
+    directory = _directory()
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".prof"):
+            try:
+                files.append((name, os.path.getsize(os.path.join(directory, name))))
+            except FileNotFoundError:
+                continue
+    total = sum(size for _, size in files)
+
+    removed = []
+    while files and (len(files) > settings.PROFILING_MAX_FILES or total > settings.PROFILING_MAX_BYTES):
+        name, size = files.pop(0)
+        total -= size
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        removed.append(name)
+    if removed:
+        ProfileCapture.objects.filter(file_name__in=removed).delete()
+    return len(removed)
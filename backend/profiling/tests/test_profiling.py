@@ -0,0 +1,120 @@
+import cProfile
+import os
+import tempfile
+from unittest import mock
+from django.test import RequestFactory, override_settings
+from messaging.tests.utils import QueryBudgetTestCase
+from profiling import middleware, storage
+from profiling.models import ProfileCapture
+
+
+class ProfilingTestCase(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        settings = override_settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0,
+                                     PROFILING_MAX_FILES=200, PROFILING_MAX_BYTES=100 * 1024 * 1024)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".prof"))
+
+
+class ProfilingMiddlewareTests(ProfilingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = self.create_user(email="staff@example.com", is_staff=True)
+        self.user = self.create_user()
+
+    def get(self, user, **headers):
+        return self.client_for(user).get("/messaging/conversations/", headers=headers)
+
+    def test_staff_can_request_a_profile(self):
+        response = self.get(self.staff, X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(capture.pk))
+        self.assertEqual((capture.trigger, capture.clock), (ProfileCapture.HEADER, ProfileCapture.WALL))
+        self.assertEqual((capture.user_id, capture.method, capture.path, capture.status_code),
+                         (self.staff.id, "GET", "/messaging/conversations/", 200))
+        self.assertEqual(self.files(), [capture.file_name])
+        self.assertEqual(capture.size, os.path.getsize(capture.file_path))
+
+    def test_cpu_clock(self):
+        self.get(self.staff, X_PROFILE="CPU")
+        self.assertEqual(ProfileCapture.objects.get().clock, ProfileCapture.CPU)
+
+    def test_header_is_ignored_for_other_users(self):
+        response = self.get(self.user, X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        response = self.client.get("/messaging/conversations/", headers={"X-Profile": "1",
+                                                                        "Authorization": "Bearer not-a-token"})
+        self.assertNotIn("X-Profile-Id", response)
+        self.staff.is_active = False
+        self.staff.save()
+        response = self.get(self.staff, X_PROFILE="1")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertFalse(ProfileCapture.objects.exists())
+        self.assertEqual(self.files(), [])
+
+    def test_sample_rate(self):
+        with override_settings(PROFILING_SAMPLE_RATE=0.25):
+            with mock.patch.object(middleware.random, "random", return_value=0.3):
+                self.assertNotIn("X-Profile-Id", self.get(self.user))
+            with mock.patch.object(middleware.random, "random", return_value=0.2):
+                response = self.get(self.user)
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(capture.pk))
+        self.assertEqual((capture.trigger, capture.clock), (ProfileCapture.SAMPLE, ProfileCapture.WALL))
+        self.assertEqual(capture.user_id, self.user.id)
+
+    def test_no_sampling_by_default(self):
+        with mock.patch.object(middleware.random, "random", return_value=0.0):
+            self.assertNotIn("X-Profile-Id", self.get(self.user))
+
+    def test_failed_save_keeps_the_response(self):
+        with mock.patch.object(storage, "save", side_effect=OSError("disk full")), \
+                self.assertLogs("profiling.middleware", "ERROR"):
+            response = self.get(self.staff, X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+
+
+class RotationTests(ProfilingTestCase):
+
+    def save(self, path="/messaging/conversations/"):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sum(range(100))
+        profiler.disable()
+        request = RequestFactory().get(path)
+        return storage.save(profiler, request, mock.Mock(status_code=200), ProfileCapture.SAMPLE,
+                            ProfileCapture.WALL, 0.01, 0.01)
+
+    def test_max_files(self):
+        with override_settings(PROFILING_MAX_FILES=3):
+            captures = [self.save() for _ in range(5)]
+        kept = [capture.file_name for capture in captures[2:]]
+        self.assertEqual(self.files(), kept)
+        self.assertEqual(sorted(ProfileCapture.objects.values_list("file_name", flat=True)), kept)
+
+    def test_max_bytes(self):
+        first = self.save()
+        with override_settings(PROFILING_MAX_BYTES=first.size * 2 + first.size // 2):
+            captures = [first] + [self.save() for _ in range(3)]
+        kept = [capture.file_name for capture in captures[2:]]
+        self.assertEqual(self.files(), kept)
+        self.assertEqual(sorted(ProfileCapture.objects.values_list("file_name", flat=True)), kept)
+
+    def test_capture_over_the_byte_cap_is_dropped(self):
+        kept = self.save()
+        with override_settings(PROFILING_MAX_BYTES=kept.size // 2):
+            self.assertIsNone(self.save())
+        self.assertEqual(self.files(), [kept.file_name])
+        self.assertEqual(ProfileCapture.objects.count(), 1)